@@ -0,0 +1,319 @@
+'''
+* One-pass trace analytics, for sizing frame counts before a sweep.
+* Reports the distinct-page footprint, the write ratio, the reuse (LRU stack)
+* distance histogram, the mean working-set size W(t, tau) for several window
+* lengths and the hottest pages. Blocks are handled with NumPy: reuse times
+* come from sorting each block by page, so the only per-event Python work is
+* the stack-distance engine (stackdist.py). By default it sees every page;
+* --rate R has it see a hash-sampled subset as in shards.py, which is faster
+* but leaves distances below about 1 / R unresolved. The working set
+* follows from reuse times: an access opens a window-sized stretch of W(t, tau)
+* until the page is used again, so sum_t W(t, tau) = sum_i min(next_i - i, tau).
+* Hot pages come from a Misra-Gries summary of top_k counters, which never
+* undercounts a page by more than events / (top_k + 1).
+*
+'''
+from collections import Counter
+import argparse
+import csv
+
+from shards import MODULUS, _hash_array, _scale_distance, page_hash
+from stackdist import LruStackDistance
+from traceio import TraceFormatError, open_trace, parse_chunks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TAUS = (1000, 10000, 100000, 1000000)
+
+
+class _DistanceStack(LruStackDistance):
+    # stack distances only: _account goes to the analyzer, the per-frame arrays stay unused
+    def __init__(self, analyzer):
+        super().__init__(1)
+        self.max_frames = 1 << 62  # never cap a distance
+        self.analyzer = analyzer
+
+    def _account(self, distance, dirty_from):
+        if distance:
+            self.analyzer._record_distance(distance)
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary with at most k counters, updated a block at a time:
+    the block's page counts are merged in and the (k+1)-th largest count is
+    taken off every counter. A page's true count lies in
+    [estimate, estimate + error].
+    """
+    def __init__(self, k):
+        self.k = k
+        self.error = 0
+        if np is not None:
+            self.keys = np.zeros(0, dtype=np.uint64)
+            self.counts = np.zeros(0, dtype=np.int64)
+        else:
+            self.table = {}
+
+    def update(self, keys, counts):
+        if np is None:
+            table = self.table
+            for key, count in zip(keys, counts):
+                table[key] = table.get(key, 0) + count
+            if len(table) > self.k:
+                cut = sorted(table.values(), reverse=True)[self.k]
+                self.error += cut
+                self.table = {key: count - cut for key, count in table.items() if count > cut}
+            return
+        keys, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate((self.counts, counts))).astype(np.int64)
+        if len(keys) > self.k:
+            cut = int(np.partition(counts, len(counts) - self.k - 1)[len(counts) - self.k - 1])
+            self.error += cut
+            keep = counts > cut
+            keys, counts = keys[keep], counts[keep] - cut
+        self.keys, self.counts = keys, counts
+
+    def top(self):
+        # [(page, estimate), ...], hottest first
+        if np is None:
+            items = self.table.items()
+        else:
+            items = zip(self.keys.tolist(), self.counts.tolist())
+        return sorted(items, key=lambda item: -item[1])
+
+
+class TraceAnalyzer:
+    def __init__(self, taus=DEFAULT_TAUS, top_k=20, rate=1.0, interval=None):
+        if not 0 < rate <= 1:
+            raise ValueError("sampling rate must be in (0, 1]")
+        if interval is not None and interval < 1:
+            raise ValueError("interval must be positive")
+        self.taus = sorted(taus)
+        self.threshold = max(1, round(rate * MODULUS))
+        self.events = 0
+        self.writes = 0
+        self.cold = 0
+        # page -> index of its latest access
+        self.last = {}
+        # sum over accesses of min(time to next use, tau), per tau
+        self.window_sums = [0] * len(self.taus)
+        # sampled distances: distance_hist[b] weighs the distances with bit_length b
+        self.stack = _DistanceStack(self)
+        self.distance_hist = [0.0] * 64
+        self.heavy = HeavyHitters(top_k)
+        # optional W(t, tau) series, sampled every interval events
+        self.interval = interval
+        self.series = []
+        self._recent = []
+
+    def _record_distance(self, distance):
+        # d - 1 sampled pages between the accesses stand for (d - 1) / R of the full trace
+        self.distance_hist[_scale_distance(distance, self.threshold).bit_length()] += 1
+
+    def resolution(self):
+        # smallest distance past 1 a sampled one can scale to, about 1 / rate
+        return 1 if self.threshold >= MODULUS else _scale_distance(2, self.threshold)
+
+    def _sample_stack(self, pages, hashes):
+        stack = self.stack
+        access = stack.access
+        threshold = self.threshold
+        for page_number, h in zip(pages, hashes):
+            if h < threshold:
+                access(page_number, False)
+        stack._maybe_compact()
+
+    def _feed_np(self, pages):
+        n = len(pages)
+        order = np.argsort(pages, kind='stable')
+        ordered = pages[order]
+        at = order + self.events  # trace index of each access, grouped by page
+        starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+        ends = np.append(starts[1:], n) - 1
+        firsts = np.zeros(n, dtype=bool)
+        firsts[starts] = True
+        # repeats within the block, then each page's first access against the trace so far
+        gaps = np.diff(at)[~firsts[1:]]
+        uniques = ordered[starts].tolist()
+        get = self.last.get
+        prev = np.fromiter((get(page_number, -1) for page_number in uniques), dtype=np.int64, count=len(uniques))
+        seen = prev >= 0
+        gaps = np.concatenate((gaps, at[starts][seen] - prev[seen]))
+        self.cold += len(uniques) - int(np.count_nonzero(seen))
+        self.last.update(zip(uniques, at[ends].tolist()))
+        for i, tau in enumerate(self.taus):
+            self.window_sums[i] += int(np.minimum(gaps, tau).sum())
+        self.heavy.update(ordered[starts], np.diff(np.append(starts, n)))
+        if self.threshold >= MODULUS:
+            self._sample_stack(pages.tolist(), [0] * n)
+        else:
+            keep = _hash_array(pages, 0) < self.threshold
+            self._sample_stack(pages[keep].tolist(), [0] * int(np.count_nonzero(keep)))
+
+    def _feed_py(self, pages):
+        last = self.last
+        taus = self.taus
+        sums = self.window_sums
+        t = self.events
+        for page_number in pages:
+            prev = last.get(page_number)
+            if prev is None:
+                self.cold += 1
+            else:
+                for i, tau in enumerate(taus):
+                    sums[i] += min(t - prev, tau)
+            last[page_number] = t
+            t += 1
+        counts = Counter(pages)
+        self.heavy.update(list(counts), list(counts.values()))
+        self._sample_stack(pages, [page_hash(page_number) for page_number in pages])
+
+    def _sample_windows(self, pages):
+        # W(t, tau) at every interval-th event, from the last max(tau) pages
+        span = self.taus[-1]
+        recent = self._recent + (pages.tolist() if hasattr(pages, 'tolist') else list(pages))
+        offset = self.events - (len(recent) - len(pages))
+        t = (self.events // self.interval + 1) * self.interval
+        while t <= self.events + len(pages):
+            end = t - offset
+            self.series.append([t] + [len(set(recent[max(0, end - tau):end])) for tau in self.taus])
+            t += self.interval
+        self._recent = recent[-span:]
+
+    def feed(self, pages, writes):
+        if len(pages) == 0:
+            return
+        if self.interval is not None:
+            self._sample_windows(pages)
+        if np is not None and isinstance(pages, np.ndarray):
+            self._feed_np(pages)
+            self.writes += int(np.count_nonzero(writes))
+        else:
+            self._feed_py(list(pages))
+            self.writes += sum(1 for write in writes if write)
+        self.events += len(pages)
+
+    def footprint(self):
+        return len(self.last)
+
+    def write_ratio(self):
+        return self.writes / self.events if self.events else 0.0
+
+    def reuse_histogram(self):
+        """
+        [(max_distance, fraction, hit_rate), ...]: the share of all accesses with
+        a reuse distance in (max_distance / 2, max_distance], and the LRU hit
+        rate with max_distance frames. Cold misses never hit.
+        """
+        sampled = sum(self.distance_hist)
+        if not sampled:
+            return []
+        # sampled shares, applied to the exact number of reuses
+        scale = (self.events - self.cold) / self.events / sampled
+        top = max(b for b, weight in enumerate(self.distance_hist) if weight)
+        rows = []
+        hit_rate = 0.0
+        for b in range(1, top + 1):
+            fraction = self.distance_hist[b] * scale
+            hit_rate += fraction
+            rows.append(((1 << b) - 1, fraction, hit_rate))
+        return rows
+
+    def working_set(self):
+        """
+        [(tau, mean W(t, tau)), ...], averaged over every window end t; windows
+        that would start before the trace are cut short.
+        """
+        if not self.events:
+            return []
+        sums = list(self.window_sums)
+        # each page's last access counts until the end of the trace
+        if np is not None:
+            lasts = np.fromiter(self.last.values(), dtype=np.int64, count=len(self.last))
+            for i, tau in enumerate(self.taus):
+                sums[i] += int(np.minimum(self.events - lasts, tau).sum())
+        else:
+            for i, tau in enumerate(self.taus):
+                sums[i] += sum(min(self.events - t, tau) for t in self.last.values())
+        return [(tau, total / self.events) for tau, total in zip(self.taus, sums)]
+
+    def top_pages(self):
+        # [(page, estimated accesses), ...], hottest first
+        return self.heavy.top()
+
+    def export_series(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["event"] + [f"W_{tau}" for tau in self.taus])
+            writer.writerows(self.series)
+
+
+def analyze(trace, page_offset=12, **options):
+    # one pass over trace (a path or an open_trace stream)
+    analyzer = TraceAnalyzer(**options)
+    for pages, writes in parse_chunks(trace, page_offset):
+        analyzer.feed(pages, writes)
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Footprint, reuse distance, working set and hot pages of a trace.")
+    parser.add_argument("inputfile", help='trace file, or "-" for stdin')
+    parser.add_argument("--page-offset", type=int, default=12)
+    parser.add_argument("--taus", default=",".join(str(tau) for tau in DEFAULT_TAUS),
+                        help="working-set window lengths, in events")
+    parser.add_argument("--top", type=int, default=20, help="hot pages to report (Misra-Gries counters)")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="page sampling rate for the reuse-distance histogram (default: exact); "
+                             "distances below about 1/rate are not resolved")
+    parser.add_argument("--interval", type=int, default=None, help="also sample W(t, tau) every N events")
+    parser.add_argument("--series", default=None, help="CSV file for the W(t, tau) samples")
+    args = parser.parse_args()
+
+    if args.series is not None and args.interval is None:
+        print("--series needs an --interval")
+        return
+    try:
+        taus = [int(tau) for tau in args.taus.split(",")]
+        trace_file = open_trace(args.inputfile)
+        analyzer = analyze(trace_file, args.page_offset, taus=taus, top_k=args.top, rate=args.rate,
+                           interval=args.interval)
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+    if args.series is not None:
+        analyzer.export_series(args.series)
+
+    events = analyzer.events
+    page_kib = (1 << args.page_offset) / 1024
+    print(f"events in trace: {events}")
+    if not events:
+        return
+    print(f"distinct pages: {analyzer.footprint()} ({analyzer.footprint() * page_kib / 1024:.1f} MiB)")
+    print(f"write ratio: {analyzer.write_ratio():.4f}")
+    print("reuse distance (lru hit rate with that many frames):")
+    resolution = analyzer.resolution()
+    if resolution > 1:
+        print(f"  (distances below {resolution} are not resolved at rate {args.rate})")
+    for distance, fraction, hit_rate in analyzer.reuse_histogram():
+        if distance < resolution:
+            continue
+        print(f"  <= {distance:>10}: {fraction:.4f}  hit rate {hit_rate:.4f}")
+    print(f"  cold: {analyzer.cold / events:.4f}")
+    print("mean working set W(t, tau):")
+    for tau, size in analyzer.working_set():
+        print(f"  tau={tau}: {size:.1f} pages")
+    error = analyzer.heavy.error
+    print(f"hottest pages (accesses, at most {error} more each):")
+    for page_number, count in analyzer.top_pages():
+        print(f"  {page_number:#x}: {count} ({count / events:.2%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+'''
+* ARC (Adaptive Replacement Cache, Megiddo & Modha).
+* Resident pages are split between T1 (used once recently) and T2 (used at
+* least twice); ghost lists B1 and B2 remember the pages last evicted from
+* each. A ghost hit moves the target size p of T1 towards the list that would
+* have kept the page, so the policy balances recency against frequency and a
+* one-off scan only churns T1. Every list is an OrderedDict (least recent
+* first), so hits and evictions are O(1).
+*
+'''
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
+from collections import OrderedDict, deque
+
+
+class ArcMMU(MMU):
+    def __init__(self, frames):
+        self.num_frames = frames
+        # frame -> page (or None)
+        self.frames = [None] * frames
+        # frame -> dirty bit
+        self.dirty = bytearray(frames)
+        self.free_frames = deque(range(frames))
+        # resident pages, page -> frame
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        # ghosts of evicted pages, page -> None
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        # target size of t1
+        self.p = 0
+        # stats
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+
+    def _replace(self, in_b2):
+        # ARC's REPLACE: evict the LRU page of t1 or t2, leaving its ghost behind
+        t1 = self.t1
+        if t1 and (len(t1) > self.p or (in_b2 and len(t1) == self.p)):
+            victim_page, frame = t1.popitem(last=False)
+            self.b1[victim_page] = None
+        else:
+            victim_page, frame = self.t2.popitem(last=False)
+            self.b2[victim_page] = None
+        return frame, victim_page
+
+    def _fault(self, page_number, is_write):
+        c = self.num_frames
+        t1 = self.t1
+        b1 = self.b1
+        b2 = self.b2
+        self.page_faults += 1
+        target = self.t2
+        if page_number in b1:
+            # recency would have kept it: grow t1
+            self.p = min(c, self.p + max(len(b2) / len(b1), 1))
+            del b1[page_number]
+            frame, victim_page = self._replace(False)
+        elif page_number in b2:
+            # frequency would have kept it: shrink t1
+            self.p = max(0, self.p - max(len(b1) / len(b2), 1))
+            del b2[page_number]
+            frame, victim_page = self._replace(True)
+        else:
+            target = t1
+            if self.free_frames:
+                # ghosts only exist once memory is full
+                frame, victim_page = self.free_frames.popleft(), None
+            elif len(t1) + len(b1) == c:
+                if len(t1) < c:
+                    b1.popitem(last=False)
+                    frame, victim_page = self._replace(False)
+                else:
+                    # t1 fills memory on its own: drop its LRU page without a ghost
+                    victim_page, frame = t1.popitem(last=False)
+            else:
+                if len(t1) + len(self.t2) + len(b1) + len(b2) == 2 * c:
+                    b2.popitem(last=False)
+                frame, victim_page = self._replace(False)
+
+        victim_dirty = False
+        if victim_page is not None:
+            victim_dirty = self.dirty[frame]
+            if victim_dirty:
+                self.disk_writes += 1
+        # disk read to load page
+        self.disk_reads += 1
+        self.frames[frame] = page_number
+        self.dirty[frame] = is_write
+        target[page_number] = frame
+        if self.tracer is not None:
+            self.tracer.record(WRITE_MISS if is_write else READ_MISS, page_number, frame, victim_page, victim_dirty)
+
+    def _hit(self, page_number):
+        # frame of a resident page, promoted to the MRU end of t2; None on a miss
+        frame = self.t1.pop(page_number, None)
+        if frame is not None:
+            self.t2[page_number] = frame
+            return frame
+        frame = self.t2.get(page_number)
+        if frame is not None:
+            self.t2.move_to_end(page_number)
+        return frame
+
+    def read_memory(self, page_number):
+        frame = self._hit(page_number)
+        if frame is not None:
+            if self.tracer is not None:
+                self.tracer.record(READ_HIT, page_number, frame)
+            return
+        self._fault(page_number, False)
+
+    def write_memory(self, page_number):
+        frame = self._hit(page_number)
+        if frame is not None:
+            self.dirty[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
+            return
+        self._fault(page_number, True)
+
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        t1_pop = self.t1.pop
+        t2 = self.t2
+        t2_get = t2.get
+        move_to_end = t2.move_to_end
+        dirty = self.dirty
+        fault = self._fault
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = t1_pop(page_number, None)
+            if frame is not None:
+                t2[page_number] = frame
+            else:
+                frame = t2_get(page_number)
+                if frame is None:
+                    # misses adapt p and move ghosts; not worth inlining
+                    fault(page_number, write)
+                    continue
+                move_to_end(page_number)
+            if write:
+                dirty[frame] = True
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_count(self):
+        # free frames always have a clear bit
+        return self.dirty.count(1)
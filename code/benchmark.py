@@ -0,0 +1,202 @@
+'''
+* Throughput benchmarks and correctness check.
+* Every policy is run on large deterministic synthetic traces at several frame
+* counts, each run in a fresh process so its peak RSS is its own. For each run
+* the trace parse time and the simulation time are reported separately, with
+* events/sec for the simulation. Throughput is compared with a stored baseline
+* and runs more than --tolerance slower are flagged as regressions. Before
+* timing anything, the policies are checked against the expected outputs in
+* traces/testing.
+*
+'''
+from multiprocessing import get_context
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from optmmu import OptMMU
+from stackdist import LruStackDistance
+from sweep import POLICIES, _parse_frames, make_mmu
+from tracecache import cache_dir
+from tracegen import Workload, write_trace
+from traceio import CHUNK_EVENTS, load_arrays, replay
+
+TESTING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "traces", "testing")
+EXPECTED_NAME = re.compile(r"(.+)-(\d+)frames-(\w+?)(\.ans)?$")
+
+# policies as run by the benchmark; "lru-stack" is the one-pass stack-distance engine
+ENGINES = list(POLICIES) + ["lru-stack"]
+
+
+def synthetic_trace(events, seed=1):
+    """
+    Path of a deterministic synthetic text trace (tracegen.py's default
+    workload), generated on first use and kept in the cache directory.
+    """
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"tracegen-{events}-{seed}.trace")
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        write_trace(tmp, Workload(seed=seed), events)
+        os.replace(tmp, path)
+    return path
+
+
+def _peak_rss_kb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    if resource is None:
+        return -1
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _bench_run(task):
+    # runs in a fresh process, so the peak RSS belongs to this run alone
+    trace, engine, frames, seed = task
+    start = time.perf_counter()
+    pages, writes = load_arrays(trace)
+    parsed = time.perf_counter()
+    if engine == "lru-stack":
+        mmu = LruStackDistance(frames)
+    elif engine == "opt":
+        mmu = OptMMU(frames, pages)
+    else:
+        mmu = make_mmu(engine, frames, seed)
+    for i in range(0, len(pages), CHUNK_EVENTS):
+        replay(mmu, pages[i:i + CHUNK_EVENTS], writes[i:i + CHUNK_EVENTS])
+    done = time.perf_counter()
+    return {
+        "engine": engine,
+        "frames": frames,
+        "seed": seed,
+        "events": len(pages),
+        "parse_seconds": parsed - start,
+        "simulate_seconds": done - parsed,
+        "events_per_sec": len(pages) / (done - parsed) if done > parsed else 0.0,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def check_expected(directory=TESTING_DIR):
+    """
+    Run every "<trace>-<N>frames-<policy>" expected output in directory and
+    return a list of (name, message) mismatches; empty when all agree.
+    """
+    failures = []
+    for name in sorted(os.listdir(directory)):
+        match = EXPECTED_NAME.match(name)
+        if match is None:
+            continue
+        trace, frames, policy = match.group(1), int(match.group(2)), match.group(3)
+        expected = {}
+        with open(os.path.join(directory, name), 'r') as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip():
+                    expected[key.strip()] = value.strip()
+        pages, writes = load_arrays(os.path.join(directory, trace))
+        mmu = make_mmu(policy, frames)
+        replay(mmu, pages, writes)
+        got = {
+            "total memory frames": str(frames),
+            "events in trace": str(len(pages)),
+            "total disk reads": str(mmu.get_total_disk_reads()),
+            "total disk writes": str(mmu.get_total_disk_writes()),
+            "page fault rate": "{0:.4f}".format(mmu.get_total_page_faults() / len(pages)),
+        }
+        for key, value in expected.items():
+            if got.get(key) != value:
+                failures.append((name, f"{key}: expected {value}, got {got.get(key)}"))
+    return failures
+
+
+def _load_baseline(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _key(result):
+    # the seed picks the synthetic trace, and rand's choices as well
+    return f"{result['engine']}/{result['frames']}/{result['events']}/{result['seed']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the replacement policies on synthetic traces.")
+    parser.add_argument("--events", default="1000000", help="trace sizes, e.g. 1000000,10000000")
+    parser.add_argument("--frames", default="64,1024", help="e.g. 64,1024 or 16-32")
+    parser.add_argument("--policies", default=",".join(ENGINES))
+    parser.add_argument("--seed", type=int, default=1, help="seed for the traces and the rand policy")
+    parser.add_argument("--baseline", default=None, help="baseline file (default: in the trace cache dir)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop (fraction)")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--skip-check", action="store_true", help="skip the traces/testing check")
+    args = parser.parse_args()
+
+    engines = args.policies.split(",")
+    for engine in engines:
+        if engine not in ENGINES:
+            print(f"Invalid replacement mode '{engine}'. Valid options are [{', '.join(ENGINES)}]")
+            return 2
+
+    failed = False
+    if not args.skip_check:
+        failures = check_expected()
+        for name, message in failures:
+            print(f"FAIL {name}: {message}")
+        print(f"expected outputs: {'FAIL' if failures else 'OK'}")
+        failed = bool(failures)
+
+    tasks = []
+    for events in (int(e) for e in args.events.split(",")):
+        trace = synthetic_trace(events, args.seed)
+        tasks.extend((trace, engine, frames, args.seed)
+                     for engine in engines for frames in _parse_frames(args.frames))
+
+    baseline_path = args.baseline or os.path.join(cache_dir(), "bench_baseline.json")
+    baseline = _load_baseline(baseline_path)
+    results = []
+    print(f"{'engine':<10} {'frames':>6} {'events':>9} {'parse s':>8} {'sim s':>8} "
+          f"{'events/s':>10} {'rss MB':>7}  vs baseline")
+    # one run at a time so runs do not compete for CPU
+    with get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(_bench_run, tasks):
+            results.append(result)
+            before = baseline.get(_key(result))
+            verdict = ""
+            if before:
+                change = result["events_per_sec"] / before - 1
+                verdict = f"{change:+.1%}"
+                if change < -args.tolerance:
+                    verdict += " REGRESSION"
+                    failed = True
+            print(f"{result['engine']:<10} {result['frames']:>6} {result['events']:>9} "
+                  f"{result['parse_seconds']:>8.2f} {result['simulate_seconds']:>8.2f} "
+                  f"{result['events_per_sec']:>10.0f} {result['peak_rss_kb'] / 1024:>7.1f}  {verdict}")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        baseline.update((_key(r), r["events_per_sec"]) for r in results)
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"baseline saved to {baseline_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+'''
+* Compact binary trace format.
+* A binary trace holds already-decoded page numbers so simulations can skip
+* text parsing entirely. Layout (little-endian):
+*
+*   header   32 bytes: magic "MEMTRACE", page_offset (u8), page width in bytes
+*            (u8, 4 or 8), 6 reserved bytes, event count (u64), 8 reserved bytes
+*   pages    count * width bytes of packed page numbers
+*   writes   ceil(count / 8) bytes, bit i (LSB first) set when event i is a write
+*
+* Files are memory-mapped on load and iterated through memoryviews, so the
+* events are never copied into Python lists.
+*
+'''
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC = b"MEMTRACE"
+HEADER = struct.Struct("<8sBB6xQ8x")
+
+
+class TraceFormatError(Exception):
+    pass
+
+
+def is_binary_trace(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IsADirectoryError, PermissionError):
+        return False
+
+
+def _convert(text_path, out_path, page_offset, width):
+    typecode = 'I' if width == 4 else 'Q'
+    count = 0
+    bits = bytearray()
+    chunk = array(typecode)
+    with open(text_path, 'r') as src, open(out_path, 'wb') as dst:
+        dst.write(HEADER.pack(MAGIC, page_offset, width, 0))
+        for line_no, trace_line in enumerate(src, start=1):
+            trace_cmd = trace_line.strip().split(" ")
+            try:
+                page_number = int(trace_cmd[0], 16) >> page_offset
+                op = trace_cmd[1]
+            except (ValueError, IndexError):
+                raise TraceFormatError(f"Badly formatted file. Error on line {line_no}")
+            if op not in ("R", "W"):
+                raise TraceFormatError(f"Badly formatted file. Error on line {line_no}")
+            # OverflowError here means the pages need 8-byte slots
+            chunk.append(page_number)
+            if count & 7 == 0:
+                bits.append(0)
+            if op == "W":
+                bits[-1] |= 1 << (count & 7)
+            count += 1
+            if len(chunk) >= 65536:
+                chunk.tofile(dst)
+                del chunk[:]
+        chunk.tofile(dst)
+        dst.write(bits)
+        dst.seek(0)
+        dst.write(HEADER.pack(MAGIC, page_offset, width, count))
+    return count
+
+
+def write_arrays(out_path, pages, writes, page_offset=12):
+    """
+    Write already decoded (pages, writes) arrays or lists as a binary trace.
+    """
+    if sys.byteorder != "little":
+        raise TraceFormatError("binary traces are only supported on little-endian hosts")
+    count = len(pages)
+    if hasattr(pages, 'dtype'):
+        import numpy as np
+        width = 4 if count == 0 or int(pages.max()) < 2 ** 32 else 8
+        with open(out_path, 'wb') as dst:
+            dst.write(HEADER.pack(MAGIC, page_offset, width, count))
+            pages.astype('<u4' if width == 4 else '<u8').tofile(dst)
+            np.packbits(np.asarray(writes, dtype=bool), bitorder='little').tofile(dst)
+        return count
+    width = 4 if count == 0 or max(pages) < 2 ** 32 else 8
+    bits = bytearray((count + 7) // 8)
+    for i, is_write in enumerate(writes):
+        if is_write:
+            bits[i >> 3] |= 1 << (i & 7)
+    with open(out_path, 'wb') as dst:
+        dst.write(HEADER.pack(MAGIC, page_offset, width, count))
+        array('I' if width == 4 else 'Q', pages).tofile(dst)
+        dst.write(bits)
+    return count
+
+
+class BinaryTraceWriter:
+    """
+    Stream (pages, writes) blocks into a binary trace of a fixed page width.
+    Pages go straight to disk; the write bitset (one bit per event) is kept in
+    memory until close(), since it follows the pages in the file.
+    """
+    def __init__(self, out_path, page_offset=12, width=8):
+        if sys.byteorder != "little":
+            raise TraceFormatError("binary traces are only supported on little-endian hosts")
+        if width not in (4, 8):
+            raise ValueError("page width must be 4 or 8 bytes")
+        self.page_offset = page_offset
+        self.width = width
+        self.count = 0
+        self.bits = bytearray()
+        self._pending = []  # write flags of a byte not yet complete
+        self._file = open(out_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, page_offset, width, 0))
+
+    def append(self, pages, writes):
+        if hasattr(pages, 'dtype'):
+            import numpy as np
+            pages.astype('<u4' if self.width == 4 else '<u8').tofile(self._file)
+            flags = np.concatenate((np.array(self._pending, dtype=bool), np.asarray(writes, dtype=bool)))
+            whole = len(flags) & ~7
+            self.bits += np.packbits(flags[:whole], bitorder='little').tobytes()
+            self._pending = flags[whole:].tolist()
+        else:
+            array('I' if self.width == 4 else 'Q', pages).tofile(self._file)
+            flags = self._pending + list(writes)
+            whole = len(flags) & ~7
+            for i in range(0, whole, 8):
+                self.bits.append(sum(1 << k for k in range(8) if flags[i + k]))
+            self._pending = flags[whole:]
+        self.count += len(pages)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._pending:
+            self.bits.append(sum(1 << k for k, flag in enumerate(self._pending) if flag))
+            self._pending = []
+        self._file.write(self.bits)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, self.page_offset, self.width, self.count))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(text_path, out_path, page_offset=12):
+    """
+    Convert a text trace ("<hex address> <R|W>" per line) to the binary format.
+    Returns the number of events written.
+    """
+    if sys.byteorder != "little":
+        raise TraceFormatError("binary traces are only supported on little-endian hosts")
+    try:
+        return _convert(text_path, out_path, page_offset, 4)
+    except OverflowError:
+        return _convert(text_path, out_path, page_offset, 8)
+
+
+class BinaryTrace:
+    def __init__(self, path):
+        # path may also be an open binary file, which the trace then owns
+        if sys.byteorder != "little":
+            raise TraceFormatError("binary traces are only supported on little-endian hosts")
+        self._file = path if hasattr(path, 'fileno') else open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        name = getattr(self._file, 'name', path)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise TraceFormatError(f"'{name}' is not a binary trace")
+        magic, self.page_offset, width, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or width not in (4, 8):
+            self.close()
+            raise TraceFormatError(f"'{name}' is not a binary trace")
+        start = HEADER.size
+        end = start + self.count * width
+        if len(self._map) < end + (self.count + 7) // 8:
+            # the header promises more events than the file holds
+            self.close()
+            raise TraceFormatError(f"'{name}' is truncated: its header lists {self.count} events")
+        view = memoryview(self._map)
+        # zero-copy views into the mapping
+        self.pages = view[start:end].cast('I' if width == 4 else 'Q')
+        self.write_bits = view[end:end + (self.count + 7) // 8]
+
+    def __len__(self):
+        return self.count
+
+    def is_write(self, i):
+        return bool(self.write_bits[i >> 3] >> (i & 7) & 1)
+
+    def close(self):
+        # views must be released before the mapping can be closed
+        for name in ("pages", "write_bits"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python bintrace.py inputfile outputfile [pageoffset]")
+        return
+
+    page_offset = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    try:
+        count = convert(sys.argv[1], sys.argv[2], page_offset)
+    except FileNotFoundError:
+        print(f"Input '{sys.argv[1]}' could not be found")
+        return
+    except TraceFormatError as e:
+        print(e)
+        return
+    print(f"wrote {count} events to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
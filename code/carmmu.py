@@ -0,0 +1,152 @@
+'''
+* CAR (Clock with Adaptive Replacement, Bansal & Modha).
+* ARC's adaptation (see arcmmu.py) with two clocks in place of its LRU lists:
+* T1 holds pages used once recently, T2 pages used again since they were
+* loaded, and ghost lists B1 and B2 steer the target size p of T1. A hit only
+* sets the page's reference bit, as in ClockMMU, so hits never reorder
+* anything; the clock hands do the sorting when a frame is needed. Each clock
+* is an OrderedDict whose first entry is under the hand.
+*
+'''
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
+from collections import OrderedDict, deque
+
+
+class CarMMU(MMU):
+    def __init__(self, frames):
+        self.num_frames = frames
+        # frame -> page (or None)
+        self.frames = [None] * frames
+        # per-frame bits, indexed like self.frames
+        self.ref = bytearray(frames)
+        self.dirty = bytearray(frames)
+        self.pt = {}  # page -> frame, resident pages only
+        self.free_frames = deque(range(frames))
+        # clocks of resident pages, page -> frame, hand at the front
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        # ghosts of evicted pages, page -> None, least recent first
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        # target size of t1
+        self.p = 0
+        # stats
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+
+    def _replace(self):
+        t1 = self.t1
+        t2 = self.t2
+        ref = self.ref
+        while True:
+            if len(t1) >= max(1, self.p):
+                page, frame = t1.popitem(last=False)
+                if not ref[frame]:
+                    self.b1[page] = None
+                    return frame, page
+                # used again while in t1: it moves to t2
+                ref[frame] = 0
+                t2[page] = frame
+            else:
+                page, frame = t2.popitem(last=False)
+                if not ref[frame]:
+                    self.b2[page] = None
+                    return frame, page
+                # second chance: back under t2's hand
+                ref[frame] = 0
+                t2[page] = frame
+
+    def _fault(self, page_number, is_write):
+        c = self.num_frames
+        t1 = self.t1
+        b1 = self.b1
+        b2 = self.b2
+        self.page_faults += 1
+        in_b1 = page_number in b1
+        in_b2 = not in_b1 and page_number in b2
+        victim_page = None
+        victim_dirty = False
+        if self.free_frames:
+            frame = self.free_frames.popleft()
+        else:
+            frame, victim_page = self._replace()
+            del self.pt[victim_page]
+            victim_dirty = self.dirty[frame]
+            if victim_dirty:
+                self.disk_writes += 1
+            if not (in_b1 or in_b2):
+                # keep the ghost lists within the directory size
+                if len(t1) + len(b1) == c:
+                    b1.popitem(last=False)
+                elif len(t1) + len(self.t2) + len(b1) + len(b2) == 2 * c:
+                    b2.popitem(last=False)
+
+        if in_b1:
+            self.p = min(c, self.p + max(len(b2) / len(b1), 1))
+            del b1[page_number]
+            self.t2[page_number] = frame
+        elif in_b2:
+            self.p = max(0, self.p - max(len(b1) / len(b2), 1))
+            del b2[page_number]
+            self.t2[page_number] = frame
+        else:
+            t1[page_number] = frame
+        # disk read to load page
+        self.disk_reads += 1
+        self.frames[frame] = page_number
+        self.pt[page_number] = frame
+        self.ref[frame] = 0
+        self.dirty[frame] = is_write
+        if self.tracer is not None:
+            self.tracer.record(WRITE_MISS if is_write else READ_MISS, page_number, frame, victim_page, victim_dirty)
+
+    def read_memory(self, page_number):
+        frame = self.pt.get(page_number)
+        if frame is not None:
+            self.ref[frame] = 1
+            if self.tracer is not None:
+                self.tracer.record(READ_HIT, page_number, frame)
+            return
+        self._fault(page_number, False)
+
+    def write_memory(self, page_number):
+        frame = self.pt.get(page_number)
+        if frame is not None:
+            self.ref[frame] = 1
+            self.dirty[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
+            return
+        self._fault(page_number, True)
+
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        lookup = self.pt.get
+        ref = self.ref
+        dirty = self.dirty
+        fault = self._fault
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = lookup(page_number)
+            if frame is None:
+                fault(page_number, write)
+                continue
+            ref[frame] = 1
+            if write:
+                dirty[frame] = True
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_count(self):
+        # free frames always have a clear bit
+        return self.dirty.count(1)
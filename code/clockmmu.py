@@ -1,11 +1,15 @@
-from mmu import MMU
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
 from collections import deque
 
 class ClockMMU(MMU):
     def __init__(self, frames):
         self.num_frames = frames
         self.frames = [None] * frames  # index -> page
-        self.pt = {}  # page -> {frame, valid, dirty, use}
+        # per-frame bits, indexed like self.frames
+        self.use = bytearray(frames)
+        self.dirty = bytearray(frames)
+        self.pt = {}  # page -> frame, resident pages only
         self.free_frames = deque(range(frames))
         # clock hand points to next candidate index
         self.clock_hand = 0
@@ -13,18 +17,27 @@ class ClockMMU(MMU):
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        # debug
-        self._debug = False
 
-    def set_debug(self):
-        self._debug = True
-
-    def reset_debug(self):
-        self._debug = False
-
-    def _debug_print(self, *args):
-        if self._debug:
-            print(*args)
+    def _sweep_use(self, start):
+        """
+        First frame at or after start (wrapping around) whose use bit is clear.
+        Every frame passed on the way gets its second chance: its use bit is
+        cleared, in bulk rather than one frame at a time. Returns -1, with every
+        use bit cleared, if all of them were set.
+        """
+        use = self.use
+        # bytearray.find scans in C, a word at a time
+        idx = use.find(0, start)
+        if idx >= 0:
+            use[start:idx] = bytes(idx - start)
+            return idx
+        use[start:] = bytes(self.num_frames - start)
+        idx = use.find(0, 0, start)
+        if idx >= 0:
+            use[:idx] = bytes(idx)
+            return idx
+        use[:start] = bytes(start)
+        return -1
 
     def _find_victim_clock(self):
         """
@@ -35,88 +48,151 @@ class ClockMMU(MMU):
         Repeat until a victim is found.
         """
         n = self.num_frames
-        # This loop is guaranteed to terminate because each iteration either picks a victim
-        # or clears a use bit; after at most n clears we will find a use==0.
-        while True:
-            idx = self.clock_hand
-            p = self.frames[idx]
-            # If (unexpectedly) the slot is free, return it immediately
-            if p is None:
-                self.clock_hand = (idx + 1) % n
-                return idx, p
-            pte = self.pt[p]
-            if not pte['use']:
-                # choose this victim; advance hand to next slot for future
-                self.clock_hand = (idx + 1) % n
-                return idx, p
-            # give second chance: clear use bit and advance hand
-            pte['use'] = False
-            self.clock_hand = (idx + 1) % n
-            # continue loop
+        use = self.use
+        idx = self.clock_hand
+        steps = 16
+        # short runs of set bits are cheapest stepped through one by one ...
+        while use[idx]:
+            use[idx] = False
+            idx = idx + 1 if idx + 1 < n else 0
+            steps -= 1
+            if not steps:
+                # ... long ones are cleared in bulk. Bits were cleared above, so a clear
+                # one is always found, at worst back where the hand started
+                idx = self._sweep_use(idx)
+                break
+        self.clock_hand = idx + 1 if idx + 1 < n else 0
+        return idx, self.frames[idx]
 
     def _load_page(self, page_number, frame, is_write):
         # disk read to load page
         self.disk_reads += 1
         # put page into frame
         self.frames[frame] = page_number
-        entry = self.pt.get(page_number)
-        if entry is None:
-            entry = {'frame': frame, 'valid': True, 'dirty': bool(is_write), 'use': True}
-            self.pt[page_number] = entry
-        else:
-            entry.update({'frame': frame, 'valid': True, 'dirty': bool(is_write), 'use': True})
-        self._debug_print(f"Loaded page {page_number} into frame {frame} (dirty={entry['dirty']})")
+        self.pt[page_number] = frame
+        self.use[frame] = True
+        self.dirty[frame] = is_write
 
-    def read_memory(self, page_number):
-        entry = self.pt.get(page_number)
-        if entry and entry['valid']:
-            entry['use'] = True
-            self._debug_print(f"READ HIT page {page_number} in frame {entry['frame']}")
-            return
-        # page fault
+    def _fault(self, page_number, is_write):
         self.page_faults += 1
-        self._debug_print(f"READ MISS page {page_number}")
+        victim_page = None
+        victim_dirty = False
         if self.free_frames:
             frame = self.free_frames.popleft()
         else:
             frame, victim_page = self._find_victim_clock()
-            ventry = self.pt[victim_page]
-            self._debug_print(f"  Removing page {victim_page} from frame {frame} (dirty={ventry['dirty']}, use={ventry['use']})")
-            if ventry['dirty']:
+            victim_dirty = self.dirty[frame]
+            if victim_dirty:
                 self.disk_writes += 1
-                self._debug_print(f"    Writing page {victim_page} to disk")
-            # mark victim invalid
-            ventry['valid'] = False
-            ventry['frame'] = None
-            ventry['use'] = False
-            # (optional) clear frame slot to avoid stale mapping until load
+            # drop victim from the page table
+            del self.pt[victim_page]
             self.frames[frame] = None
-        self._load_page(page_number, frame, is_write=False)
+        self._load_page(page_number, frame, is_write)
+        if self.tracer is not None:
+            self.tracer.record(WRITE_MISS if is_write else READ_MISS, page_number, frame, victim_page, victim_dirty)
+
+    def read_memory(self, page_number):
+        frame = self.pt.get(page_number)
+        if frame is not None:
+            self.use[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(READ_HIT, page_number, frame)
+            return
+        # page fault
+        self._fault(page_number, False)
 
     def write_memory(self, page_number):
-        entry = self.pt.get(page_number)
-        if entry and entry['valid']:
-            entry['use'] = True
-            entry['dirty'] = True
-            self._debug_print(f"WRITE HIT page {page_number} in frame {entry['frame']} (now dirty)")
+        frame = self.pt.get(page_number)
+        if frame is not None:
+            self.use[frame] = True
+            self.dirty[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
             return
         # page fault
-        self.page_faults += 1
-        self._debug_print(f"WRITE MISS page {page_number}")
-        if self.free_frames:
-            frame = self.free_frames.popleft()
-        else:
-            frame, victim_page = self._find_victim_clock()
-            ventry = self.pt[victim_page]
-            self._debug_print(f"  Removing page {victim_page} from frame {frame} (dirty={ventry['dirty']}, use={ventry['use']})")
-            if ventry['dirty']:
-                self.disk_writes += 1
-                self._debug_print(f"    Writing page {victim_page} to disk")
-            ventry['valid'] = False
-            ventry['frame'] = None
-            ventry['use'] = False
-            self.frames[frame] = None
-        self._load_page(page_number, frame, is_write=True)
+        self._fault(page_number, True)
+
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        pt = self.pt
+        lookup = pt.get
+        frames = self.frames
+        use = self.use
+        dirty = self.dirty
+        free_frames = self.free_frames
+        find_victim = self._find_victim_clock
+        faults = 0
+        write_backs = 0
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = lookup(page_number)
+            if frame is not None:
+                use[frame] = True
+                if write:
+                    dirty[frame] = True
+                continue
+            faults += 1
+            if free_frames:
+                frame = free_frames.popleft()
+            else:
+                frame, victim_page = find_victim()
+                if dirty[frame]:
+                    write_backs += 1
+                del pt[victim_page]
+            frames[frame] = page_number
+            pt[page_number] = frame
+            use[frame] = True
+            dirty[frame] = write
+        self.page_faults += faults
+        self.disk_reads += faults
+        self.disk_writes += write_backs
+
+    def resize(self, frames):
+        """
+        Change the number of frames. Shrinking evicts pages the way the hand
+        would: from the hand onwards, unused pages go and used ones get their
+        second chance, wrapping around until the rest fit; dirty victims are
+        written back. The survivors then move to the lowest frames, in order
+        from the hand, which restarts at frame 0. Growing adds free frames.
+        """
+        if frames < 1:
+            raise ValueError("Frame number must be at least 1")
+        n = self.num_frames
+        hand = self.clock_hand
+        use = self.use
+        dirty = self.dirty
+        # occupied frames in the order the hand reaches them
+        ring = [f for f in range(hand, n) if self.frames[f] is not None] + \
+               [f for f in range(hand) if self.frames[f] is not None]
+        excess = len(ring) - frames
+        if excess > 0:
+            victims = set()
+            i = 0
+            while excess:
+                f = ring[i % len(ring)]
+                i += 1
+                if f in victims:
+                    continue
+                if use[f]:
+                    use[f] = False
+                    continue
+                victims.add(f)
+                if dirty[f]:
+                    self.disk_writes += 1
+                del self.pt[self.frames[f]]
+                excess -= 1
+            # the hand stops just past the last victim
+            start = i % len(ring)
+            ring = [f for f in ring[start:] + ring[:start] if f not in victims]
+        k = len(ring)
+        self.frames = [self.frames[f] for f in ring] + [None] * (frames - k)
+        self.use = bytearray(use[f] for f in ring) + bytearray(frames - k)
+        self.dirty = bytearray(dirty[f] for f in ring) + bytearray(frames - k)
+        self.pt = {page_number: frame for frame, page_number in enumerate(self.frames[:k])}
+        self.free_frames = deque(range(k, frames))
+        self.clock_hand = 0
+        self.num_frames = frames
 
     def get_total_disk_reads(self):
         return self.disk_reads
@@ -126,3 +202,7 @@ class ClockMMU(MMU):
 
     def get_total_page_faults(self):
         return self.page_faults
+
+    def get_resident_dirty_count(self):
+        # free frames always have a clear bit
+        return self.dirty.count(1)
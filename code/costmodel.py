@@ -0,0 +1,179 @@
+'''
+* Disk latency cost model.
+* A CostModel is attached to an MMU in place of an EventTracer and turns its
+* accesses into simulated time: every access costs access_time, and a fault
+* stalls until its page has been read in. The disk serves queue_depth
+* requests at once, in the order they are issued. A dirty victim has to be
+* written back before its frame can be reused, so without a write-back buffer
+* the fault waits for the write and then the read. With a buffer of
+* write_buffer pages the victim is copied out and the read goes first; the
+* buffered writes go to the disk only while it would otherwise sit idle, and
+* a started write is not preempted. A fault waits for a write only when the
+* buffer is full or its read queues behind a write already on the disk; that
+* wait is counted as write stall. Times are in microseconds.
+*
+'''
+from collections import deque, namedtuple
+from heapq import heappop, heappush, heapreplace
+import argparse
+
+from optmmu import OptMMU
+from sweep import POLICIES, _parse_frames, make_mmu
+from tracelog import READ_HIT, WRITE_HIT
+from traceio import CHUNK_EVENTS, TraceFormatError, load_arrays, parse_chunks, replay
+
+CostResult = namedtuple("CostResult", "policy frames events page_faults disk_writes total_time fault_stall write_stall")
+
+
+class CostModel:
+    def __init__(self, read_latency=100.0, write_latency=200.0, queue_depth=1, write_buffer=0, access_time=0.1):
+        if min(read_latency, write_latency, access_time) < 0:
+            raise ValueError("latencies must not be negative")
+        if queue_depth < 1 or write_buffer < 0:
+            raise ValueError("queue depth must be at least 1 and the write buffer not negative")
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.write_buffer = write_buffer
+        self.access_time = access_time
+        self.now = 0.0
+        # heap of the times each disk slot is next free
+        self.disk = [0.0] * queue_depth
+        # buffered write-backs not yet on the disk, by the time they were buffered
+        self.queued = deque()
+        # heap of completion times of buffered write-backs on the disk
+        self.pending = []
+        # time spent waiting on faults, and the part of it spent on write-backs
+        self.fault_stall = 0.0
+        self.write_stall = 0.0
+        self.faults = 0
+        self.write_backs = 0
+
+    def _issue(self, latency):
+        # queue a request on the first free disk slot; returns when it completes
+        done = max(self.now, self.disk[0]) + latency
+        heapreplace(self.disk, done)
+        return done
+
+    def _drain(self):
+        # start buffered writes on slots that fell idle before now
+        queued = self.queued
+        disk = self.disk
+        while queued:
+            start = max(disk[0], queued[0])
+            if start >= self.now:
+                break
+            queued.popleft()
+            done = start + self.write_latency
+            heapreplace(disk, done)
+            heappush(self.pending, done)
+
+    def record(self, op, page, frame, victim=None, victim_dirty=False):
+        self.now += self.access_time
+        if op == READ_HIT or op == WRITE_HIT:
+            return
+        self.faults += 1
+        start = self.now
+        self._drain()
+        if victim_dirty:
+            self.write_backs += 1
+            if self.write_buffer:
+                pending = self.pending
+                while pending and pending[0] <= self.now:
+                    heappop(pending)
+                while len(self.queued) + len(pending) >= self.write_buffer:
+                    # buffer full: wait for the oldest write-back, starting it if need be
+                    if pending:
+                        self.now = heappop(pending)
+                    else:
+                        self.queued.popleft()
+                        self.now = self._issue(self.write_latency)
+                    self._drain()
+                    while pending and pending[0] <= self.now:
+                        heappop(pending)
+                self.queued.append(self.now)
+            else:
+                # the frame is only free once its old contents are on disk
+                self.now = self._issue(self.write_latency)
+        # reads come one at a time, so a slot still busy now is busy with a write
+        self.now += max(self.disk[0] - self.now, 0.0)
+        self.write_stall += self.now - start
+        self.now = self._issue(self.read_latency)
+        self.fault_stall += self.now - start
+
+    def close(self):
+        pass
+
+
+def run_costs(trace, policies, frame_counts, page_offset=12, seed=None, **timing):
+    """
+    Simulate every (policy, frames) pair on one pass over trace, each MMU with
+    a CostModel(**timing) attached, and return CostResult records.
+    """
+    for policy in policies:
+        if policy not in POLICIES or policy == "shards":
+            raise ValueError(f"Invalid replacement mode '{policy}'")
+    if "opt" in policies:
+        # OPT needs the whole trace up front to know each page's next use
+        pages, writes = load_arrays(trace, page_offset)
+        blocks = [(pages[i:i + CHUNK_EVENTS], writes[i:i + CHUNK_EVENTS]) for i in range(0, len(pages), CHUNK_EVENTS)]
+    else:
+        blocks = parse_chunks(trace, page_offset)
+
+    runs = []
+    for policy in policies:
+        for frames in frame_counts:
+            mmu = OptMMU(frames, pages) if policy == "opt" else make_mmu(policy, frames, seed)
+            model = CostModel(**timing)
+            mmu.set_tracer(model)
+            runs.append((policy, frames, mmu, model))
+    events = 0
+    for block_pages, block_writes in blocks:
+        for _, _, mmu, _ in runs:
+            replay(mmu, block_pages, block_writes)
+        events += len(block_pages)
+    return [CostResult(policy, frames, events, mmu.get_total_page_faults(), mmu.get_total_disk_writes(),
+                       model.now, model.fault_stall, model.write_stall)
+            for policy, frames, mmu, model in runs]
+
+
+def main():
+    PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+    parser = argparse.ArgumentParser(description="Compare policies on simulated time, with a disk latency model.")
+    parser.add_argument("inputfile")
+    parser.add_argument("frames", help="e.g. 64 or 16,64,256")
+    parser.add_argument("--policies", default="rand,lru,clock,esc")
+    parser.add_argument("--read-latency", type=float, default=100.0, help="microseconds per page read")
+    parser.add_argument("--write-latency", type=float, default=200.0, help="microseconds per page write")
+    parser.add_argument("--queue-depth", type=int, default=1, help="requests the disk serves at once")
+    parser.add_argument("--write-buffer", type=int, default=0, help="pages of asynchronous write-back buffer")
+    parser.add_argument("--access-time", type=float, default=0.1, help="microseconds per memory access")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand policy")
+    args = parser.parse_args()
+
+    frame_counts = _parse_frames(args.frames)
+    if min(frame_counts) < 1:
+        print("Frame number must be at least 1\n")
+        return
+    try:
+        results = run_costs(args.inputfile, args.policies.split(","), frame_counts, PAGE_OFFSET, args.seed,
+                            read_latency=args.read_latency, write_latency=args.write_latency,
+                            queue_depth=args.queue_depth, write_buffer=args.write_buffer,
+                            access_time=args.access_time)
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+
+    print(f"{'policy':<8} {'frames':>7} {'faults':>10} {'writes':>10} {'total ms':>12} {'stall ms':>12} "
+          f"{'write ms':>12} {'stall %':>8}")
+    for r in results:
+        stall_share = r.fault_stall / r.total_time if r.total_time else 0.0
+        print(f"{r.policy:<8} {r.frames:>7} {r.page_faults:>10} {r.disk_writes:>10} {r.total_time / 1000:>12.1f} "
+              f"{r.fault_stall / 1000:>12.1f} {r.write_stall / 1000:>12.1f} {stall_share:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
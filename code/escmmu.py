@@ -0,0 +1,80 @@
+'''
+* Enhanced Second Chance (dirty-aware clock) replacement.
+* Frames are ranked by their (use, dirty) bits and the hand prefers clean,
+* unused pages, so workloads with many writes pay for fewer write-backs:
+*   pass 1: look for (0, 0) without touching any bits
+*   pass 2: look for (0, 1), clearing use bits on the way
+* and repeat; after pass 2 every use bit is clear, so the next round succeeds.
+*
+'''
+from clockmmu import ClockMMU
+
+
+class EscMMU(ClockMMU):
+    def __init__(self, frames, compare_clock=False):
+        super().__init__(frames)
+        # optional plain clock run on the same accesses, to measure avoided write-backs
+        self.baseline = ClockMMU(frames) if compare_clock else None
+
+    def _find_clean_unused(self, start):
+        # first (use=0, dirty=0) frame at or after start, wrapping around, else -1;
+        # OR-ing windows of both bitmaps as big integers keeps the scan in C
+        n = self.num_frames
+        use = self.use
+        dirty = self.dirty
+        for lo, hi in ((start, n), (0, start)):
+            width = 256
+            while lo < hi:
+                end = min(hi, lo + width)
+                either = int.from_bytes(use[lo:end], 'little') | int.from_bytes(dirty[lo:end], 'little')
+                found = either.to_bytes(end - lo, 'little').find(0)
+                if found >= 0:
+                    return lo + found
+                lo = end
+                width = min(width * 2, 1 << 16)
+        return -1
+
+    def _find_victim_clock(self):
+        n = self.num_frames
+        hand = self.clock_hand
+        if not self.use[hand] and not self.dirty[hand]:
+            # the common case: the hand already points at a clean, unused frame
+            self.clock_hand = (hand + 1) % n
+            return hand, self.frames[hand]
+        while True:
+            # pass 1: first (use=0, dirty=0) frame from the hand
+            idx = self._find_clean_unused(self.clock_hand)
+            if idx < 0:
+                # pass 2: first (use=0, dirty=1) frame, giving second chances as we go
+                idx = self._sweep_use(self.clock_hand)
+            if idx >= 0:
+                self.clock_hand = (idx + 1) % n
+                return idx, self.frames[idx]
+
+    def read_memory(self, page_number):
+        super().read_memory(page_number)
+        if self.baseline is not None:
+            self.baseline.read_memory(page_number)
+
+    def write_memory(self, page_number):
+        super().write_memory(page_number)
+        if self.baseline is not None:
+            self.baseline.write_memory(page_number)
+
+    def process_batch(self, pages, is_write):
+        super().process_batch(pages, is_write)
+        # with a tracer the batch went through read_memory/write_memory, which feed the baseline
+        if self.baseline is not None and self.tracer is None:
+            self.baseline.process_batch(pages, is_write)
+
+    def resize(self, frames):
+        # the plain clock baseline keeps the same number of frames
+        super().resize(frames)
+        if self.baseline is not None:
+            self.baseline.resize(frames)
+
+    def get_write_backs_avoided(self):
+        # disk writes plain clock made on the same trace minus ours (negative if worse)
+        if self.baseline is None:
+            return None
+        return self.baseline.get_total_disk_writes() - self.disk_writes
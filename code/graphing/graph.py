@@ -1,16 +1,24 @@
 ## To run just type "python3 graph.py"
-## It needs an edited version of memsum.py, which is now located in the "graphing" folder
+## Simulations run in-process through sweep.py (one directory up), one trace parse per trace
 ## To ensure smooth execution, please check if path need to check (It's under "Run experiments")
 ## If new parameter is used in the experiment, please also check file's name respectively (It's at the very last lines) 
 
-import subprocess
+import os
+import sys
 import matplotlib.pyplot as plt
 
+# the MMU implementations live one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from resultstore import ResultStore
+from sweep import run_sweep
+
 # Configurations
 traces = ["swim.trace", "sixpack.trace", "gcc.trace", "bzip.trace"]
-types = ["rand", "lru", "clock"]
+types = ["rand", "lru", "clock", "arc", "car", "opt"]  # opt is the lower bound for the others
 cache_sizes = range(1, 100)
-memsim_path = "memsim.py"
+shards_rate = None  # e.g. 0.1 adds a sampled estimate of the lru curve from about 1 / rate frames, see shards.py
+if shards_rate is not None:
+    types.append("shards")
 
 # Data storage: {type: {trace: [(cache_size, hit_rate), ...]}}
 results = {
@@ -18,57 +26,47 @@ results = {
     for t in types
 }
 
-# Run experiments
-for t in types:
-    for trace in traces:
-        print(f"Running {t} on {trace} ...")
-        for cache in cache_sizes:
-            cmd = [
-                "python3", memsim_path,
-                f"../all_trace_file/{trace}",
-                str(cache),
-                t,
-                "quiet"
-            ]
-            output = subprocess.check_output(cmd, text=True).strip().splitlines()
-            last_line = output[-1].strip()
-
-            # Safe parsing
-            parts = {}
-            for item in last_line.split(","):
-                if "=" in item:
-                    k, v = item.split("=")
-                    parts[k.strip()] = v.strip()
+def main():
+    # Run experiments: every trace is parsed once and the grid runs on all cores.
+    # Cells already in the results store are not rerun, so replotting takes seconds.
+    # rand is seeded so its results can be stored too.
+    print(f"Running {types} on {traces} ...")
+    with ResultStore() as store:
+        sweep = run_sweep([f"../all_trace_file/{trace}" for trace in traces], types, cache_sizes,
+                          seed=1, store=store, sample_rate=shards_rate or 0.01)
+    for r in sweep:
+        trace = os.path.basename(r.trace)
+        hit_rate = 1 - (r.page_faults / r.events)
+        results[r.policy][trace]["hit_rate"].append((r.frames, hit_rate))
+        results[r.policy][trace]["reads"].append((r.frames, r.disk_reads))
+        results[r.policy][trace]["writes"].append((r.frames, r.disk_writes))
+        results[r.policy][trace]["reads_writes"].append((r.frames, r.disk_reads + r.disk_writes))
 
-            frames = int(parts["frames"].strip("[]"))
-            hit_rate = float(parts["hit_rate"])
-            reads = int(parts["reads"])
-            writes = int(parts["writes"])
-            reads_writes = int(parts["reads_writes"])
 
-            results[t][trace]["hit_rate"].append((frames, hit_rate))
-            results[t][trace]["reads"].append((frames, reads))
-            results[t][trace]["writes"].append((frames, writes))
-            results[t][trace]["reads_writes"].append((frames, reads_writes))
+    # Plot results per trace and metric
+    # metrics = ["hit_rate", "reads", "writes", "reads_writes"]
+    metrics = ["reads_writes"]
 
+    for trace in traces:
+        for metric in metrics:
+            plt.figure(figsize=(10, 6))
+            for t in types:
+                if not results[t][trace][metric]:
+                    continue  # shards has no points below its resolution
+                sizes, values = zip(*results[t][trace][metric])
+                plt.plot(sizes, values, label=t)
+            print(f"Creating {metric} graph for {trace}...")
+            plt.title(f"Cache Performance ({metric}) - {trace}")
+            plt.xlabel("Cache Size")
+            plt.ylabel(metric.capitalize())
+            plt.legend()
+            plt.grid(True)
+            plt.tight_layout()
+            plt.savefig(f"{trace}_{metric}_100_cache_size.png")
+            print(f"{trace} ({metric}) has been saved!")
+            plt.show()
 
-# Plot results per trace and metric
-# metrics = ["hit_rate", "reads", "writes", "reads_writes"]
-metrics = ["reads_writes"]
 
-for trace in traces:
-    for metric in metrics:
-        plt.figure(figsize=(10, 6))
-        for t in types:
-            sizes, values = zip(*results[t][trace][metric])
-            plt.plot(sizes, values, label=t)
-        print(f"Creating {metric} graph for {trace}...")
-        plt.title(f"Cache Performance ({metric}) - {trace}")
-        plt.xlabel("Cache Size")
-        plt.ylabel(metric.capitalize())
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(f"{trace}_{metric}_100_cache_size.png")
-        print(f"{trace} ({metric}) has been saved!")
-        plt.show()
+# guarded so worker processes started by the sweep pool do not rerun the experiments
+if __name__ == "__main__":
+    main()
@@ -4,40 +4,28 @@
 from lrummu import LruMMU
 from clockmmu import ClockMMU
 from randmmu import RandMMU
+from metrics import WindowedMetrics
+from tracecache import load_cached
 import matplotlib.pyplot as plt
 
 def simulate_with_segmentation(mmu_class, trace_file, frames, num_segments=10):
     PAGE_OFFSET = 12
-    with open(trace_file, 'r') as f:
-        lines = f.readlines()
-    total_events = len(lines)
-    segment_size = total_events // num_segments
+    # decoded once and cached on disk (see tracecache.py), then fed a segment at a time
+    pages, writes = load_cached(trace_file, PAGE_OFFSET)
+    segment_size = len(pages) // num_segments
 
-    mmu = mmu_class(frames)
+    # counters are read only at segment boundaries; the trailing partial segment is dropped
+    metrics = WindowedMetrics(mmu_class(frames), window=segment_size)
+    rows = metrics.run([(pages, writes)], keep_partial=False)
 
     results = {"segment": [], "reads": [], "writes": [], "faults": [], "hit_rate": []}
 
-    for i, line in enumerate(lines, start=1):
-        addr, op = line.strip().split()
-        page = int(addr, 16) >> PAGE_OFFSET
-
-        if op == "R":
-            mmu.read_memory(page)
-        elif op == "W":
-            mmu.write_memory(page)
-
-        if i % segment_size == 0:
-            seg_id = i // segment_size
-            reads = mmu.get_total_disk_reads()
-            writes = mmu.get_total_disk_writes()
-            faults = mmu.get_total_page_faults()
-            hit_rate = 1 - faults / i
-
-            results["segment"].append(seg_id)
-            results["reads"].append(reads)
-            results["writes"].append(writes)
-            results["faults"].append(faults)
-            results["hit_rate"].append(hit_rate)
+    for row in rows:
+        results["segment"].append(row["window"])
+        results["reads"].append(row["total_reads"])
+        results["writes"].append(row["total_writes"])
+        results["faults"].append(row["total_faults"])
+        results["hit_rate"].append(1 - row["total_faults"] / row["end_event"])
 
     return results
 
@@ -1,8 +1,12 @@
+import os
+import sys
+
+# the MMU implementations live one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 from clockmmu import ClockMMU
 from lrummu import LruMMU
 from randmmu import RandMMU
-
-import sys
+from traceio import TraceFormatError, parse_chunks
 
 
 def main():
@@ -63,23 +67,13 @@ def main():
     no_events = 0
 
 
-    with open(input_file, 'r') as trace_file:
-        for trace_line in trace_file:
-            trace_cmd = trace_line.strip().split(" ")
-            logical_address = int(trace_cmd[0], 16)
-            page_number = logical_address >>  PAGE_OFFSET
-
-
-            # Process read or write
-            if trace_cmd[1] == "R":
-                mmu.read_memory(page_number)
-            elif trace_cmd[1] == "W":
-                mmu.write_memory(page_number)
-            else:
-                print(f"Badly formatted file. Error on line {no_events + 1}")
-                return
-
-            no_events += 1
+    try:
+        for pages, writes in parse_chunks(input_file, PAGE_OFFSET):
+            mmu.process_batch(pages, writes)
+            no_events += len(pages)
+    except TraceFormatError as e:
+        print(e)
+        return
 
     # # TODO: Print results
     # print(f"total memory frames: {frames}")
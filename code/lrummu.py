@@ -1,4 +1,5 @@
-from mmu import MMU
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
 from collections import OrderedDict, deque
 
 class LruMMU(MMU):
@@ -7,108 +8,127 @@ class LruMMU(MMU):
         self.num_frames = frames
         # frame -> page (or None)
         self.frames = [None] * frames
-        # page table: page -> {frame, valid, dirty, use}
-        self.pt = {}
+        # frame -> dirty bit
+        self.dirty = bytearray(frames)
         # free frames
         self.free_frames = deque(range(frames))
-        # keep LRU order as OrderedDict: key=page, value=frame. Least-recent at beginning.
+        # page table, resident pages only, kept in LRU order as OrderedDict:
+        # key=page, value=frame. Least-recent at beginning.
         self.lru = OrderedDict()
         # stats
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        # debug
-        self._debug = False
-
-    def set_debug(self):
-        self._debug = True
-
-    def reset_debug(self):
-        self._debug = False
-
-    def _debug_print(self, *args):
-        if self._debug:
-            print(*args)
 
     def _remove_lru(self):
         # pop first item from OrderedDict (least recently used)
         if not self.lru:
             raise RuntimeError("LRU eviction requested but no pages present")
-        victim_page, victim_frame = next(iter(self.lru.items()))
-        # remove
-        self.lru.pop(victim_page)
+        victim_page, victim_frame = self.lru.popitem(last=False)
         return victim_frame, victim_page
 
     def _load_page(self, page_number, frame, is_write):
         # disk read to load page
         self.disk_reads += 1
         self.frames[frame] = page_number
-        entry = self.pt.get(page_number)
-        if entry is None:
-            entry = {'frame': frame, 'valid': True, 'dirty': bool(is_write), 'use': True}
-            self.pt[page_number] = entry
-        else:
-            entry.update({'frame': frame, 'valid': True, 'dirty': bool(is_write), 'use': True})
-        # move to most-recent in lru
-        if page_number in self.lru:
-            self.lru.pop(page_number)
+        self.dirty[frame] = is_write
+        # most-recent in lru
         self.lru[page_number] = frame
-        self._debug_print(f"Loaded page {page_number} into frame {frame} (dirty={entry['dirty']})")
 
-    def read_memory(self, page_number):
-        entry = self.pt.get(page_number)
-        if entry and entry['valid']:
-            # hit: update LRU (move to end)
-            entry['use'] = True
-            if page_number in self.lru:
-                self.lru.pop(page_number)
-            self.lru[page_number] = entry['frame']
-            self._debug_print(f"READ HIT page {page_number} in frame {entry['frame']}")
-            return
-        # miss
+    def _fault(self, page_number, is_write):
         self.page_faults += 1
-        self._debug_print(f"READ MISS page {page_number}")
+        victim_page = None
+        victim_dirty = False
         if self.free_frames:
             frame = self.free_frames.popleft()
         else:
             frame, victim_page = self._remove_lru()
-            ventry = self.pt[victim_page]
-            self._debug_print(f"  Removing page {victim_page} from frame {frame} (dirty={ventry['dirty']})")
-            if ventry['dirty']:
+            victim_dirty = self.dirty[frame]
+            if victim_dirty:
                 self.disk_writes += 1
-                self._debug_print(f"    Writing page {victim_page} to disk")
-            ventry['valid'] = False
-            ventry['frame'] = None
-            ventry['use'] = False
-        self._load_page(page_number, frame, is_write=False)
+        self._load_page(page_number, frame, is_write)
+        if self.tracer is not None:
+            self.tracer.record(WRITE_MISS if is_write else READ_MISS, page_number, frame, victim_page, victim_dirty)
+
+    def read_memory(self, page_number):
+        frame = self.lru.get(page_number)
+        if frame is not None:
+            # hit: update LRU (move to end)
+            self.lru.move_to_end(page_number)
+            if self.tracer is not None:
+                self.tracer.record(READ_HIT, page_number, frame)
+            return
+        # miss
+        self._fault(page_number, False)
 
     def write_memory(self, page_number):
-        entry = self.pt.get(page_number)
-        if entry and entry['valid']:
+        frame = self.lru.get(page_number)
+        if frame is not None:
             # hit
-            entry['dirty'] = True
-            entry['use'] = True
-            if page_number in self.lru:
-                self.lru.pop(page_number)
-            self.lru[page_number] = entry['frame']
-            self._debug_print(f"WRITE HIT page {page_number} in frame {entry['frame']} (now dirty)")
+            self.dirty[frame] = True
+            self.lru.move_to_end(page_number)
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
             return
         # miss
-        self.page_faults += 1
-        self._debug_print(f"WRITE MISS page {page_number}")
-        if self.free_frames:
-            frame = self.free_frames.popleft()
-        else:
-            frame, victim_page = self._remove_lru()
-            ventry = self.pt[victim_page]
-            self._debug_print(f"  Removing page {victim_page} from frame {frame} (dirty={ventry['dirty']})")
-            if ventry['dirty']:
+        self._fault(page_number, True)
+
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        lru = self.lru
+        lookup = lru.get
+        move_to_end = lru.move_to_end
+        popitem = lru.popitem
+        frames = self.frames
+        dirty = self.dirty
+        free_frames = self.free_frames
+        faults = 0
+        write_backs = 0
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = lookup(page_number)
+            if frame is not None:
+                move_to_end(page_number)
+                if write:
+                    dirty[frame] = True
+                continue
+            faults += 1
+            if free_frames:
+                frame = free_frames.popleft()
+            else:
+                frame = popitem(last=False)[1]
+                if dirty[frame]:
+                    write_backs += 1
+            frames[frame] = page_number
+            dirty[frame] = write
+            lru[page_number] = frame
+        self.page_faults += faults
+        self.disk_reads += faults
+        self.disk_writes += write_backs
+
+    def resize(self, frames):
+        """
+        Change the number of frames. Shrinking evicts least recently used pages,
+        writing back dirty ones, until the rest fit; the survivors then move to
+        the lowest frames. Growing adds free frames.
+        """
+        if frames < 1:
+            raise ValueError("Frame number must be at least 1")
+        while len(self.lru) > frames:
+            frame, _ = self._remove_lru()
+            if self.dirty[frame]:
                 self.disk_writes += 1
-                self._debug_print(f"    Writing page {victim_page} to disk")
-            ventry['valid'] = False
-            ventry['frame'] = None
-            ventry['use'] = False
-        self._load_page(page_number, frame, is_write=True)
+        # renumber the resident pages 0..k-1, in LRU order
+        old_dirty = self.dirty
+        self.dirty = bytearray(frames)
+        self.frames = [None] * frames
+        for frame, page_number in enumerate(self.lru):
+            self.dirty[frame] = old_dirty[self.lru[page_number]]
+            self.frames[frame] = page_number
+            self.lru[page_number] = frame
+        self.free_frames = deque(range(len(self.lru), frames))
+        self.num_frames = frames
 
     def get_total_disk_reads(self):
         return self.disk_reads
@@ -118,3 +138,7 @@ class LruMMU(MMU):
 
     def get_total_page_faults(self):
         return self.page_faults
+
+    def get_resident_dirty_count(self):
+        # free frames always have a clear bit
+        return self.dirty.count(1)
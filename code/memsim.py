@@ -1,9 +1,42 @@
+from arcmmu import ArcMMU
+from carmmu import CarMMU
 from clockmmu import ClockMMU
+from escmmu import EscMMU
 from lrummu import LruMMU
+from metrics import WindowedMetrics
+from optmmu import OptMMU
 from randmmu import RandMMU
+from shards import ShardsMMU
+from tracelog import EventTracer
+from traceio import (CHUNK_EVENTS, REDUCE_UNSAFE, TraceFormatError, load_arrays, open_trace, parse_chunks,
+                     reduce_arrays, reduce_runs, replay)
 
+import argparse
 import sys
 
+MODES = ("rand", "lru", "clock", "arc", "car", "esc", "opt")
+
+
+def _parse_options(args):
+    # optional flags that may follow the four positional arguments
+    parser = argparse.ArgumentParser(prog="memsim.py inputfile numberframes replacementmode debugmode",
+                                     add_help=False)
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand replacement mode")
+    parser.add_argument("--trace-log", default=None, help="write a binary event log, see tracelog.py")
+    parser.add_argument("--window", type=int, default=None, help="report metrics every N events")
+    parser.add_argument("--window-seconds", type=float, default=None,
+                        help="report metrics every S seconds of simulation")
+    parser.add_argument("--metrics", default=None, help="per-window metrics file (.csv or .json)")
+    parser.add_argument("--reduce", action="store_true",
+                        help="fold runs of accesses to one page into single events before simulating")
+    parser.add_argument("--shards", type=float, default=None, metavar="RATE",
+                        help="estimate lru by sampling pages at this rate, see shards.py")
+    parser.add_argument("--shards-pages", type=int, default=None,
+                        help="bound the sampled pages, lowering the rate as needed")
+    parser.add_argument("--shards-replicas", type=int, default=4,
+                        help="independent samplers behind the error estimate")
+    return parser.parse_args(args)
+
 
 def main():
     PAGE_OFFSET = 12  # page is 2^12 = 4KB
@@ -17,15 +50,7 @@ def main():
         return
 
     input_file = sys.argv[1]
-
-    try:
-        with open(input_file, 'r') as file:
-            # Read the trace file contents
-            trace_contents = file.readlines()
-    except FileNotFoundError:
-        print(f"Input '{input_file}' could not be found")
-        print("Usage: python memsim.py inputfile numberframes replacementmode debugmode")
-        return
+    options = _parse_options(sys.argv[5:])
 
     frames = int(sys.argv[2])
     if frames < 1:
@@ -33,53 +58,149 @@ def main():
        return
 
     replacement_mode = sys.argv[3]
+    if replacement_mode not in MODES:
+        print("Invalid replacement mode. Valid options are [rand, lru, clock, arc, car, esc, opt]")
+        return
 
-    # Setup MMU based on replacement mode
-    if replacement_mode == "rand":
-        mmu = RandMMU(frames)
-    elif replacement_mode == "lru":
-        mmu = LruMMU(frames)
-    elif replacement_mode == "clock":
-        mmu = ClockMMU(frames)
-    else:
-        print("Invalid replacement mode. Valid options are [rand, lru, esc]")
+    if options.shards is not None and replacement_mode != "lru":
+        print("--shards only applies to the lru replacement mode")
         return
 
     debug_mode  = sys.argv[4]
-
-    # Set debug mode
-    if debug_mode == "debug":
-        mmu.set_debug()
-    elif debug_mode == "quiet":
-        mmu.reset_debug()
-    else:
+    if debug_mode not in ("debug", "quiet"):
         print("Invalid debug mode. Valid options are [debug, quiet]")
         return
 
-    ############################################################
-    # Main Loop: Process the addresses from the trace file     #
-    ############################################################
+    if options.reduce and (debug_mode == "debug" or options.trace_log is not None
+                           or options.window is not None or options.window_seconds is not None):
+        # these report individual events, which a reduced stream no longer has
+        print("--reduce cannot be combined with debug mode, --trace-log or windowed metrics")
+        return
 
-    no_events = 0
+    if options.reduce and options.shards is not None:
+        # the samplers count the events they see, so they need every one of them
+        print("--reduce cannot be combined with --shards")
+        return
 
+    if options.reduce and replacement_mode in REDUCE_UNSAFE:
+        # repeated hits change arc and car state, so folding them changes the results
+        print(f"--reduce cannot be combined with the {replacement_mode} replacement mode")
+        return
 
-    with open(input_file, 'r') as trace_file:
-        for trace_line in trace_file:
-            trace_cmd = trace_line.strip().split(" ")
-            logical_address = int(trace_cmd[0], 16)
-            page_number = logical_address >>  PAGE_OFFSET
+    if options.shards is not None and (debug_mode == "debug" or options.trace_log is not None
+                                       or options.window is not None or options.window_seconds is not None):
+        # sampled estimates have no individual events or resident pages to report
+        print("--shards cannot be combined with debug mode, --trace-log or windowed metrics")
+        return
 
+    if (options.window is not None or options.window_seconds is not None) and options.metrics is None:
+        print("--window and --window-seconds need a --metrics output file")
+        return
 
-            # Process read or write
-            if trace_cmd[1] == "R":
-                mmu.read_memory(page_number)
-            elif trace_cmd[1] == "W":
-                mmu.write_memory(page_number)
-            else:
-                print(f"Badly formatted file. Error on line {no_events + 1}")
+    try:
+        # opened once and streamed; "-" reads stdin, compressed traces are decoded on the fly
+        trace_file = open_trace(input_file)
+    except FileNotFoundError:
+        print(f"Input '{input_file}' could not be found")
+        print("Usage: python memsim.py inputfile numberframes replacementmode debugmode")
+        return
+    except TraceFormatError as e:
+        print(e)
+        return
+
+    with trace_file:
+        # whole blocks of the trace are decoded at once, then replayed through the MMU
+        blocks = None
+
+        # Setup MMU based on replacement mode
+        if replacement_mode == "rand":
+            mmu = RandMMU(frames, seed=options.seed)
+        elif replacement_mode == "lru" and options.shards is not None:
+            try:
+                mmu = ShardsMMU(frames, options.shards, options.shards_pages, options.shards_replicas)
+            except ValueError as e:
+                print(e)
                 return
+            if frames < mmu.resolution():
+                # sampled distances cannot tell such small caches apart
+                print(f"--shards {options.shards} cannot resolve fewer than {mmu.resolution()} frames")
+                return
+        elif replacement_mode == "lru":
+            mmu = LruMMU(frames)
+        elif replacement_mode == "clock":
+            mmu = ClockMMU(frames)
+        elif replacement_mode == "arc":
+            mmu = ArcMMU(frames)
+        elif replacement_mode == "car":
+            mmu = CarMMU(frames)
+        elif replacement_mode == "esc":
+            mmu = EscMMU(frames, compare_clock=True)
+        else:
+            # OPT needs the whole trace up front to know each page's next use
+            try:
+                pages, writes = load_arrays(trace_file, PAGE_OFFSET)
+            except TraceFormatError as e:
+                print(e)
+                return
+            # next uses must be indexed on the stream the MMU will actually see
+            mmu = OptMMU(frames, reduce_arrays(pages, writes)[0] if options.reduce else pages)
+            # replayed in blocks so only one block at a time is expanded to Python ints
+            blocks = [(pages[i:i + CHUNK_EVENTS], writes[i:i + CHUNK_EVENTS])
+                      for i in range(0, len(pages), CHUNK_EVENTS)]
+
+        # Set debug mode
+        if debug_mode == "debug":
+            mmu.set_debug()
+        else:
+            mmu.reset_debug()
+
+        if options.trace_log is not None:
+            mmu.set_tracer(EventTracer(path=options.trace_log, echo=debug_mode == "debug"))
+
+        metrics = None
+        if options.window is not None or options.window_seconds is not None:
+            try:
+                metrics = WindowedMetrics(mmu, options.window, options.window_seconds)
+            except ValueError as e:
+                print(e)
+                return
+
+        ############################################################
+        # Main Loop: Process the addresses from the trace file     #
+        ############################################################
 
-            no_events += 1
+        no_events = 0
+
+        try:
+            if blocks is None:
+                blocks = parse_chunks(trace_file, PAGE_OFFSET)
+            if options.reduce:
+                # events counts the original accesses each reduced block stands for
+                blocks = reduce_runs(blocks)
+            else:
+                blocks = ((pages, writes, len(pages)) for pages, writes in blocks)
+            for pages, writes, events in blocks:
+                if metrics is not None:
+                    metrics.feed(pages, writes)
+                else:
+                    replay(mmu, pages, writes)
+                no_events += events
+        except TraceFormatError as e:
+            print(e)
+            return
+        finally:
+            if mmu.tracer is not None:
+                mmu.tracer.close()
+
+    if metrics is not None:
+        metrics.finish()
+        metrics.export(options.metrics)
+
+    if isinstance(mmu, ShardsMMU) and frames < mmu.resolution():
+        # a fixed-size sampler lowered its rate past the frame count
+        print(f"--shards-pages {options.shards_pages} lowered the sampling rate too far to resolve "
+              f"{frames} frames")
+        return
 
     # TODO: Print results
     print(f"total memory frames: {frames}")
@@ -88,6 +209,10 @@ def main():
     print(f"total disk writes: {mmu.get_total_disk_writes()}")
     print("page fault rate: ", end="")
     print("{0:.4f}".format(mmu.get_total_page_faults() / no_events))
+    if replacement_mode == "esc":
+        print(f"write-backs avoided vs clock: {mmu.get_write_backs_avoided()}")
+    if isinstance(mmu, ShardsMMU):
+        print("page fault rate error: ±{0:.4f}".format(mmu.get_fault_rate_error()))
 
 if __name__ == "__main__":
     main()
@@ -5,20 +5,49 @@
 * the limited number of frames. The MMU keeps records, which will be used
 * to analyse the performance of different replacement strategies implemented
 * for the MMU.
+* process_batch feeds a whole block of accesses at once; policies override it
+* with a tight loop over local variables to avoid per-event call overhead.
+* Debugging goes through an optional EventTracer (tracelog.py); when none is
+* attached the MMUs do no tracing work at all.
 *
 '''
+from tracelog import EventTracer
+
+
+def as_list(seq):
+    # NumPy arrays, array.array and memoryviews become plain lists of Python ints
+    return seq.tolist() if hasattr(seq, 'tolist') else seq
+
+
 class MMU:
+    # event tracer, None when tracing is off
+    tracer = None
+
     def read_memory(self, page_number):
         pass
 
     def write_memory(self, page_number):
         pass
 
+    def process_batch(self, pages, is_write):
+        # generic fallback: one call per event
+        read_memory = self.read_memory
+        write_memory = self.write_memory
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            if write:
+                write_memory(page_number)
+            else:
+                read_memory(page_number)
+
+    def set_tracer(self, tracer):
+        self.tracer = tracer
+
     def set_debug(self):
-        pass
+        # debug mode: trace every access and print it as it happens
+        self.set_tracer(EventTracer(echo=True))
 
     def reset_debug(self):
-        pass
+        self.set_tracer(None)
 
     def get_total_disk_reads(self):
         return -1
@@ -28,3 +57,6 @@ class MMU:
 
     def get_total_page_faults(self):
         return -1
+
+    def get_resident_dirty_count(self):
+        return -1
@@ -0,0 +1,227 @@
+'''
+* Multi-process simulation over one shared pool of frames.
+* Traces carry a pid on every line (see traceio.parse_pid_chunks). A process's
+* page is keyed as (pid << PID_SHIFT) | page, so a single dict lookup finds it
+* however many processes there are, and the existing policies run unchanged:
+*   global: one MMU over the whole pool; a fault may evict any process's page
+*   local:  each process owns a fixed quota of the pool and only replaces its
+*           own pages, through an MMU of its own
+* Events, faults and write-backs are reported per process. In global scope
+* faults and write-backs are only split by process on request (charge), as
+* that goes through the MMU's tracer hook and so its per-event path; a
+* write-back is charged to the process whose page was evicted.
+*
+'''
+from collections import Counter, namedtuple
+import argparse
+
+from sweep import POLICIES, make_mmu
+from tracelog import READ_MISS, WRITE_MISS
+from traceio import TraceFormatError, open_trace, parse_pid_chunks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PID_SHIFT = 48  # virtual addresses have at most 48 bits, so page numbers fit below
+MAX_PID = (1 << (64 - PID_SHIFT)) - 1
+SCOPES = ("global", "local")
+
+ProcessStats = namedtuple("ProcessStats", "pid events page_faults disk_writes")
+
+
+class _ProcessCharges:
+    # stands in for an EventTracer, counting misses and write-backs per process
+    def __init__(self):
+        self.faults = Counter()
+        self.writes = Counter()
+
+    def record(self, op, page, frame, victim=None, victim_dirty=False):
+        if op == READ_MISS or op == WRITE_MISS:
+            self.faults[page >> PID_SHIFT] += 1
+            if victim_dirty:
+                self.writes[victim >> PID_SHIFT] += 1
+
+    def close(self):
+        pass
+
+
+class MultiProcessMMU:
+    def __init__(self, frames, policy="lru", scope="global", quota=None, seed=None, charge=False):
+        if policy not in POLICIES or policy in ("opt", "shards"):
+            raise ValueError(f"Invalid replacement mode '{policy}'")
+        if scope not in SCOPES:
+            raise ValueError(f"Invalid scope '{scope}'. Valid options are {list(SCOPES)}")
+        self.num_frames = frames
+        self.policy = policy
+        self.scope = scope
+        self.seed = seed
+        self.events = Counter()  # pid -> events
+        if scope == "global":
+            self.mmu = make_mmu(policy, frames, seed)
+            # without a tracer the MMU keeps its batch path
+            self.charges = _ProcessCharges() if charge else None
+            self.mmu.set_tracer(self.charges)
+        else:
+            if quota is None or quota < 1:
+                raise ValueError("local replacement needs at least one frame per process")
+            self.quota = quota
+            self.processes = {}  # pid -> MMU over its quota of frames
+
+    def _process(self, pid):
+        mmu = self.processes.get(pid)
+        if mmu is None:
+            if (len(self.processes) + 1) * self.quota > self.num_frames:
+                raise ValueError(f"{self.num_frames} frames cannot give {len(self.processes) + 1} processes "
+                                 f"{self.quota} frames each")
+            mmu = make_mmu(self.policy, self.quota, None if self.seed is None else self.seed + pid)
+            self.processes[pid] = mmu
+        return mmu
+
+    def _process_batch_np(self, pids, pages, is_write):
+        if pids.min() < 0 or pids.max() > MAX_PID or (pages >> np.uint64(PID_SHIFT)).any():
+            raise TraceFormatError(f"pids must be in [0, {MAX_PID}] and pages below 2^{PID_SHIFT}")
+        if self.scope == "global":
+            self.mmu.process_batch((pids.astype(np.uint64) << np.uint64(PID_SHIFT)) | pages, is_write)
+            present, counts = np.unique(pids, return_counts=True)
+            self.events.update(dict(zip(present.tolist(), counts.tolist())))
+            return
+        # processes do not interact, so each one's events can be fed as a group
+        order = np.argsort(pids, kind='stable')
+        grouped = pids[order]
+        starts = np.flatnonzero(np.concatenate(([True], grouped[1:] != grouped[:-1]))).tolist()
+        for start, end in zip(starts, starts[1:] + [len(pids)]):
+            pid = int(grouped[start])
+            picked = order[start:end]
+            self._process(pid).process_batch(pages[picked], is_write[picked])
+            self.events[pid] += end - start
+
+    def process_batch(self, pids, pages, is_write):
+        if len(pids) == 0:
+            return
+        if np is not None and isinstance(pids, np.ndarray):
+            return self._process_batch_np(pids, pages, is_write)
+        if min(pids) < 0 or max(pids) > MAX_PID or max(pages) >> PID_SHIFT:
+            raise TraceFormatError(f"pids must be in [0, {MAX_PID}] and pages below 2^{PID_SHIFT}")
+        self.events.update(pids)
+        if self.scope == "global":
+            self.mmu.process_batch([(pid << PID_SHIFT) | page for pid, page in zip(pids, pages)], is_write)
+            return
+        groups = {}
+        for pid, page_number, write in zip(pids, pages, is_write):
+            group = groups.get(pid)
+            if group is None:
+                group = groups[pid] = ([], [])
+            group[0].append(page_number)
+            group[1].append(write)
+        for pid, (group_pages, group_writes) in groups.items():
+            self._process(pid).process_batch(group_pages, group_writes)
+
+    def _total(self, getter):
+        if self.scope == "global":
+            return getattr(self.mmu, getter)()
+        return sum(getattr(mmu, getter)() for mmu in self.processes.values())
+
+    def get_total_disk_reads(self):
+        return self._total("get_total_disk_reads")
+
+    def get_total_disk_writes(self):
+        return self._total("get_total_disk_writes")
+
+    def get_total_page_faults(self):
+        return self._total("get_total_page_faults")
+
+    def process_stats(self):
+        # [ProcessStats, ...] ordered by pid; faults and writes are None in global
+        # scope unless charged
+        stats = []
+        for pid in sorted(self.events):
+            if self.scope == "global" and self.charges is None:
+                faults = writes = None
+            elif self.scope == "global":
+                faults = self.charges.faults[pid]
+                writes = self.charges.writes[pid]
+            else:
+                mmu = self.processes[pid]
+                faults = mmu.get_total_page_faults()
+                writes = mmu.get_total_disk_writes()
+            stats.append(ProcessStats(pid, self.events[pid], faults, writes))
+        return stats
+
+
+def count_processes(trace, page_offset=12):
+    # distinct pids in a multi-process trace, in a pass of its own
+    pids = set()
+    for block_pids, _, _ in parse_pid_chunks(trace, page_offset):
+        pids.update(np.unique(block_pids).tolist() if np is not None else block_pids)
+    return len(pids)
+
+
+def run_processes(trace, frames, policy="lru", scope="global", quota=None, page_offset=12, seed=None,
+                  charge=False):
+    """
+    Simulate a multi-process trace and return its MultiProcessMMU. In local
+    scope without a quota the pool is split evenly between the trace's
+    processes, which takes an extra pass, so trace must then be a path.
+    """
+    if scope == "local" and quota is None:
+        if not isinstance(trace, str) or trace == "-":
+            raise ValueError("local replacement on a stream needs a quota")
+        quota = frames // max(count_processes(trace, page_offset), 1)
+    mmu = MultiProcessMMU(frames, policy, scope, quota, seed, charge)
+    for pids, pages, writes in parse_pid_chunks(trace, page_offset):
+        mmu.process_batch(pids, pages, writes)
+    return mmu
+
+
+def main():
+    PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+    parser = argparse.ArgumentParser(description="Simulate a trace of many processes sharing one pool of frames.")
+    parser.add_argument("inputfile", help='"<pid> <hex address> <R|W>" lines, or "-" for stdin')
+    parser.add_argument("numberframes", type=int)
+    parser.add_argument("replacementmode")
+    parser.add_argument("scope", help="global or local replacement")
+    parser.add_argument("--quota", type=int, default=None,
+                        help="frames per process in local scope (default: an even split)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand replacement mode")
+    parser.add_argument("--charge", action="store_true",
+                        help="split faults and write-backs by process in global scope (per-event, slower)")
+    args = parser.parse_args()
+
+    if args.numberframes < 1:
+        print("Frame number must be at least 1\n")
+        return
+    try:
+        trace = args.inputfile
+        if trace == "-" or args.scope != "local" or args.quota is not None:
+            # a single pass: stream it
+            trace = open_trace(trace)
+        mmu = run_processes(trace, args.numberframes, args.replacementmode, args.scope, args.quota,
+                            PAGE_OFFSET, args.seed, args.charge)
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+
+    events = sum(mmu.events.values())
+    print(f"total memory frames: {args.numberframes}")
+    print(f"events in trace: {events}")
+    print(f"total disk reads: {mmu.get_total_disk_reads()}")
+    print(f"total disk writes: {mmu.get_total_disk_writes()}")
+    print("page fault rate: ", end="")
+    print("{0:.4f}".format(mmu.get_total_page_faults() / events if events else 0.0))
+    print(f"{'pid':>6} {'events':>12} {'faults':>12} {'fault rate':>10} {'disk writes':>12}")
+    for s in mmu.process_stats():
+        if s.page_faults is None:
+            print(f"{s.pid:>6} {s.events:>12} {'-':>12} {'-':>10} {'-':>12}")
+        else:
+            print(f"{s.pid:>6} {s.events:>12} {s.page_faults:>12} {s.page_faults / s.events:>10.4f} "
+                  f"{s.disk_writes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+'''
+* Multiplexed simulator.
+* The trace is read and decoded once, and every block of events is dispatched
+* to a whole set of MMUs covering several policies, frame counts and page
+* sizes (PAGE_OFFSET values). Blocks are decoded at the smallest page offset
+* and shifted once per larger one, so a full policy comparison costs one pass
+* of I/O and parsing. Results are printed as one combined table.
+*
+'''
+from collections import namedtuple
+import argparse
+
+from mmu import as_list
+from optmmu import OptMMU, build_next_use
+from stackdist import LruStackDistance
+from sweep import POLICIES, _parse_frames, make_mmu
+from traceio import CHUNK_EVENTS, TraceFormatError, load_arrays, parse_chunks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# with this many LRU frame counts, one stack-distance pass beats separate LruMMUs
+STACK_LRU_MIN = 12
+
+MultiResult = namedtuple("MultiResult", "policy frames page_offset events disk_reads disk_writes page_faults")
+
+
+def _shift(pages, shift):
+    if shift == 0:
+        return pages
+    if np is not None and isinstance(pages, np.ndarray):
+        return pages >> np.uint64(shift)
+    return [page >> shift for page in pages]
+
+
+def run_multi(trace, policies, frame_counts, page_offsets=(12,), seed=None):
+    """
+    Simulate every (policy, frames, page offset) combination on one pass over
+    trace (a path or an open_trace stream) and return MultiResult records.
+    """
+    for policy in policies:
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid replacement mode '{policy}'")
+    frame_counts = sorted(set(frame_counts))
+    page_offsets = sorted(set(page_offsets))
+    base = page_offsets[0]
+
+    if "opt" in policies:
+        # OPT needs the whole trace up front to know each page's next use
+        all_pages, all_writes = load_arrays(trace, base)
+        blocks = [(all_pages[i:i + CHUNK_EVENTS], all_writes[i:i + CHUNK_EVENTS])
+                  for i in range(0, len(all_pages), CHUNK_EVENTS)]
+    else:
+        blocks = parse_chunks(trace, base)
+
+    # page offset -> [(policy, frame counts served, engine)]
+    groups = {}
+    for page_offset in page_offsets:
+        engines = groups[page_offset] = []
+        for policy in policies:
+            if policy == "lru" and len(frame_counts) >= STACK_LRU_MIN:
+                engines.append((policy, frame_counts, LruStackDistance(frame_counts[-1])))
+                continue
+            if policy == "opt":
+                next_use = build_next_use(_shift(all_pages, page_offset - base))
+            for frames in frame_counts:
+                if policy == "opt":
+                    mmu = OptMMU(frames, next_use=next_use)
+                else:
+                    mmu = make_mmu(policy, frames, seed)
+                engines.append((policy, [frames], mmu))
+
+    events = 0
+    for pages, writes in blocks:
+        # converted to Python ints once per page size, not once per MMU
+        writes = as_list(writes)
+        for page_offset, engines in groups.items():
+            shifted = as_list(_shift(pages, page_offset - base))
+            for _, _, engine in engines:
+                engine.process_batch(shifted, writes)
+        events += len(pages)
+
+    results = []
+    for page_offset, engines in groups.items():
+        for policy, served, engine in engines:
+            for frames in served:
+                if isinstance(engine, LruStackDistance):
+                    counts = (engine.get_total_disk_reads(frames), engine.get_total_disk_writes(frames),
+                              engine.get_total_page_faults(frames))
+                else:
+                    counts = (engine.get_total_disk_reads(), engine.get_total_disk_writes(),
+                              engine.get_total_page_faults())
+                results.append(MultiResult(policy, frames, page_offset, events, *counts))
+    policy_order = {policy: i for i, policy in enumerate(policies)}
+    results.sort(key=lambda r: (r.page_offset, policy_order[r.policy], r.frames))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many MMU configurations on one pass over a trace.")
+    parser.add_argument("inputfile", help='trace file, "-" for stdin')
+    parser.add_argument("--policies", default="rand,lru,clock")
+    parser.add_argument("--frames", default="4,8,16,32,64", help="e.g. 1-99 or 4,8,16")
+    parser.add_argument("--page-offsets", default="12", help="e.g. 12 or 12,13,14")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand policy")
+    args = parser.parse_args()
+
+    frame_counts = _parse_frames(args.frames)
+    if min(frame_counts) < 1:
+        print("Frame number must be at least 1\n")
+        return
+    try:
+        results = run_multi(args.inputfile, args.policies.split(","), frame_counts,
+                            [int(p) for p in args.page_offsets.split(",")], args.seed)
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+
+    print(f"events in trace: {results[0].events if results else 0}")
+    print(f"{'policy':<8} {'frames':>7} {'offset':>6} {'disk reads':>11} {'disk writes':>11} {'fault rate':>10}")
+    for r in results:
+        rate = r.page_faults / r.events if r.events else 0.0
+        print(f"{r.policy:<8} {r.frames:>7} {r.page_offset:>6} {r.disk_reads:>11} {r.disk_writes:>11} "
+              f"{rate:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+'''
+* Belady's optimal (OPT / MIN) replacement.
+* Evicts the resident page whose next use lies furthest in the future, which
+* gives the lower bound on page faults for any policy. The whole trace must be
+* known up front: a reverse pass builds a next-occurrence index, and victims
+* come off a max-heap keyed by next use, so each fault is O(log frames).
+*
+'''
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
+from array import array
+from collections import deque
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def build_next_use(pages):
+    """
+    next_use[i] is the index of the next access to pages[i], or len(pages) if
+    the page is never touched again. Returned as a compact array.
+    """
+    n = len(pages)
+    if np is not None and isinstance(pages, np.ndarray):
+        # stable sort groups each page's accesses in time order
+        order = np.argsort(pages, kind='stable')
+        sorted_pages = pages[order]
+        next_use = np.full(n, n, dtype=np.uint32 if n < 2 ** 32 else np.uint64)
+        same = sorted_pages[1:] == sorted_pages[:-1]
+        next_use[order[:-1][same]] = order[1:][same]
+        return next_use
+    typecode = 'I' if n < 2 ** 32 else 'Q'
+    next_use = array(typecode, bytes(array(typecode).itemsize * n))
+    last = {}
+    for i in range(n - 1, -1, -1):
+        page_number = pages[i]
+        next_use[i] = last.get(page_number, n)
+        last[page_number] = i
+    return next_use
+
+
+class OptMMU(MMU):
+    def __init__(self, frames, pages=None, next_use=None):
+        # accesses must then be replayed in exactly the order of pages
+        if next_use is None:
+            next_use = build_next_use(pages)
+        if np is not None and isinstance(next_use, np.ndarray):
+            # array.array indexes as fast as a list at 4-8 bytes per event
+            compact = array('I' if next_use.dtype == np.uint32 else 'Q')
+            compact.frombytes(next_use.tobytes())
+            next_use = compact
+        self.next_use = next_use
+        self.time = 0
+        self.num_frames = frames
+        self.frames = [None] * frames  # frame -> page
+        self.dirty = bytearray(frames)
+        self.pt = {}  # page -> frame, resident pages only
+        self.page_next = {}  # resident page -> index of its next use
+        # max-heap of (-next_use, page); stale entries are skipped lazily
+        self.heap = []
+        self.free_frames = deque(range(frames))
+        # stats
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+
+    def _touch(self, page_number):
+        nu = self.next_use[self.time]
+        self.time += 1
+        self.page_next[page_number] = nu
+        heap = self.heap
+        heapq.heappush(heap, (-nu, page_number))
+        if len(heap) > 4 * self.num_frames + 64:
+            # drop stale entries so the heap stays O(frames)
+            self.heap = [(-n, p) for p, n in self.page_next.items()]
+            heapq.heapify(self.heap)
+
+    def _find_victim(self):
+        heap = self.heap
+        page_next = self.page_next
+        while True:
+            neg_nu, page_number = heapq.heappop(heap)
+            if page_next.get(page_number) == -neg_nu:
+                return page_number
+
+    def _fault(self, page_number, is_write):
+        self.page_faults += 1
+        victim_page = None
+        victim_dirty = False
+        if self.free_frames:
+            frame = self.free_frames.popleft()
+        else:
+            victim_page = self._find_victim()
+            frame = self.pt.pop(victim_page)
+            del self.page_next[victim_page]
+            victim_dirty = self.dirty[frame]
+            if victim_dirty:
+                self.disk_writes += 1
+        self.disk_reads += 1
+        self.frames[frame] = page_number
+        self.pt[page_number] = frame
+        self.dirty[frame] = is_write
+        if self.tracer is not None:
+            self.tracer.record(WRITE_MISS if is_write else READ_MISS, page_number, frame, victim_page, victim_dirty)
+
+    def read_memory(self, page_number):
+        frame = self.pt.get(page_number)
+        if frame is None:
+            self._fault(page_number, False)
+        elif self.tracer is not None:
+            self.tracer.record(READ_HIT, page_number, frame)
+        self._touch(page_number)
+
+    def write_memory(self, page_number):
+        frame = self.pt.get(page_number)
+        if frame is None:
+            self._fault(page_number, True)
+        else:
+            self.dirty[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
+        self._touch(page_number)
+
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        pt = self.pt
+        lookup = pt.get
+        frames = self.frames
+        dirty = self.dirty
+        free_frames = self.free_frames
+        page_next = self.page_next
+        next_use = self.next_use
+        heappush = heapq.heappush
+        find_victim = self._find_victim
+        heap_limit = 4 * self.num_frames + 64
+        t = self.time
+        faults = 0
+        write_backs = 0
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = lookup(page_number)
+            if frame is not None:
+                if write:
+                    dirty[frame] = True
+            else:
+                faults += 1
+                if free_frames:
+                    frame = free_frames.popleft()
+                else:
+                    victim_page = find_victim()
+                    frame = pt.pop(victim_page)
+                    del page_next[victim_page]
+                    if dirty[frame]:
+                        write_backs += 1
+                frames[frame] = page_number
+                pt[page_number] = frame
+                dirty[frame] = write
+            nu = next_use[t]
+            t += 1
+            page_next[page_number] = nu
+            heappush(self.heap, (-nu, page_number))
+            if len(self.heap) > heap_limit:
+                self.heap = [(-n, p) for p, n in page_next.items()]
+                heapq.heapify(self.heap)
+        self.time = t
+        self.page_faults += faults
+        self.disk_reads += faults
+        self.disk_writes += write_backs
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+    def get_resident_dirty_count(self):
+        # free frames always have a clear bit
+        return self.dirty.count(1)
@@ -0,0 +1,124 @@
+'''
+* Page-fault-frequency (PFF) frame allocation.
+* The trace runs in windows of a fixed number of events (see metrics.py). At
+* the end of each window its fault rate is checked against a band [low, high]:
+* above it the MMU is given a step more frames, below it a step fewer, through
+* the MMU's resize(). Every window row records the allocation it ran with next
+* to its fault rate, so one adaptive run traces out the memory/fault tradeoff
+* that a sweep over fixed frame counts would.
+*
+'''
+from math import ceil
+import argparse
+
+from clockmmu import ClockMMU
+from lrummu import LruMMU
+from metrics import FIELDS, WindowedMetrics
+from randmmu import RandMMU
+from traceio import TraceFormatError, open_trace, parse_chunks
+
+# policies whose MMUs can be resized
+POLICIES = {
+    "rand": RandMMU,
+    "lru": LruMMU,
+    "clock": ClockMMU,
+}
+
+
+class PffController(WindowedMetrics):
+    fields = FIELDS + ("frames",)
+
+    def __init__(self, mmu, frames, window=10000, low=0.02, high=0.1, step=0.25, min_frames=1, max_frames=None):
+        super().__init__(mmu, window=window)
+        if not 0 <= low <= high:
+            raise ValueError("fault rate band needs 0 <= low <= high")
+        if step <= 0:
+            raise ValueError("step must be positive")
+        if min_frames < 1 or (max_frames is not None and max_frames < min_frames):
+            raise ValueError("frame limits need 1 <= min_frames <= max_frames")
+        self.frames = frames
+        self.low = low
+        self.high = high
+        self.step = step
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        # largest allocation a window ran with
+        self.peak_frames = frames
+        # sum over events of the frames allocated at the time
+        self.frame_events = 0
+
+    def _close_window(self):
+        n = self.events - self._start_event
+        super()._close_window()
+        self.rows[-1]["frames"] = self.frames
+        self.frame_events += self.frames * n
+        self.peak_frames = max(self.peak_frames, self.frames)
+        rate = self.rows[-1]["faults"] / n if n else 0.0
+        frames = self.frames
+        if rate > self.high:
+            frames = ceil(frames * (1 + self.step))
+            if self.max_frames is not None:
+                frames = min(frames, self.max_frames)
+        elif rate < self.low:
+            frames = max(int(frames * (1 - self.step)), self.min_frames)
+        if frames != self.frames:
+            self.mmu.resize(frames)
+            self.frames = frames
+
+    def mean_frames(self):
+        # allocation averaged over the events run so far
+        return self.frame_events / self.events if self.events else float(self.frames)
+
+
+def main():
+    PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+    parser = argparse.ArgumentParser(description="Run a trace with page-fault-frequency frame allocation.")
+    parser.add_argument("inputfile", help='trace file, or "-" for stdin')
+    parser.add_argument("numberframes", type=int, help="initial allocation")
+    parser.add_argument("replacementmode", help=f"one of {list(POLICIES)}")
+    parser.add_argument("--window", type=int, default=10000, help="events between allocation decisions")
+    parser.add_argument("--low", type=float, default=0.02, help="shrink below this window fault rate")
+    parser.add_argument("--high", type=float, default=0.1, help="grow above this window fault rate")
+    parser.add_argument("--step", type=float, default=0.25, help="fraction of the allocation added or taken")
+    parser.add_argument("--min-frames", type=int, default=1)
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand replacement mode")
+    parser.add_argument("--metrics", default=None, help="per-window allocation and faults (.csv or .json)")
+    args = parser.parse_args()
+
+    if args.numberframes < 1:
+        print("Frame number must be at least 1\n")
+        return
+    if args.replacementmode not in POLICIES:
+        print(f"Invalid replacement mode. Valid options are {list(POLICIES)}")
+        return
+    if args.replacementmode == "rand":
+        mmu = RandMMU(args.numberframes, seed=args.seed)
+    else:
+        mmu = POLICIES[args.replacementmode](args.numberframes)
+    try:
+        controller = PffController(mmu, args.numberframes, args.window, args.low, args.high, args.step,
+                                   args.min_frames, args.max_frames)
+        controller.run(parse_chunks(open_trace(args.inputfile), PAGE_OFFSET))
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+    if args.metrics is not None:
+        controller.export(args.metrics)
+
+    events = controller.events
+    print(f"mean memory frames: {controller.mean_frames():.1f}")
+    print(f"peak memory frames: {controller.peak_frames}")
+    print(f"events in trace: {events}")
+    print(f"total disk reads: {mmu.get_total_disk_reads()}")
+    print(f"total disk writes: {mmu.get_total_disk_writes()}")
+    print("page fault rate: ", end="")
+    print("{0:.4f}".format(mmu.get_total_page_faults() / events if events else 0.0))
+
+
+if __name__ == "__main__":
+    main()
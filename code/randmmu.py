@@ -4,117 +4,142 @@ Written by Hung a1884747
 """
 
 
-from mmu import MMU
+from mmu import MMU, as_list
+from tracelog import READ_HIT, READ_MISS, WRITE_HIT, WRITE_MISS
 import random
 
 
 class RandMMU(MMU):
 
 
-    def __init__(self, frames):
+    def __init__(self, frames, seed=None):
         self.frames = frames
-        self.page_table = {}  # page_number -> {'frame': frame_number, 'modified': bool}
-        self.free_frames = list(range(frames))  # list of free frames
+        self.page_table = {}  # page_number -> frame_number, resident pages only
+        self.resident = [None] * frames  # frame_number -> page_number
+        self.modified = bytearray(frames)  # frame_number -> modified bit
+        self.free_frames = list(range(frames - 1, -1, -1))  # free frames, lowest popped first
+        # per-instance RNG so seeded runs are reproducible, also across worker processes
+        self.rng = random.Random(seed)
         # stats
         self.total_disk_reads = 0
         self.total_disk_writes = 0
         self.total_page_faults = 0
-        # debug
-        self.verbose = False
         
 
     def _evict_random_page(self):
-        # randomly choose victim page to evict
-        victim_page = random.choice(list(self.page_table.keys()))
-        victim_info = self.page_table[victim_page]
-        frame = victim_info['frame']
-        if self.verbose:
-            print(f"Randomly selected page {victim_page} in frame {frame} for eviction")
+        # randomly choose victim page to evict; only called when every frame is in use
+        frame = self.rng.randrange(self.frames)
+        victim_page = self.resident[frame]
         
         # stat update
-        if victim_info['modified']:
+        victim_modified = self.modified[frame]
+        if victim_modified:
             self.total_disk_writes += 1
-            if self.verbose:
-                print(f"Writing modified page {victim_page} to disk")
         
         # remove victim from page table, but still exists on disk
         del self.page_table[victim_page]
-        if self.verbose:
-            print(f"Evicted page {victim_page} from frame {frame}")
-        return frame
+        return frame, victim_page, victim_modified
 
 
-    def read_memory(self, page_number):
-        if self.verbose:
-            print(f"Reading page {page_number}")
-        
-        # check for hit
-        if page_number in self.page_table:
-            if self.verbose:
-                frame = self.page_table[page_number]
-                print(f"Page {page_number} found in frame {frame}")
-            return
-        
+    def _page_fault(self, page_number, is_write):
         # miss/page-fault, therefore must be read from disk
         self.total_disk_reads += 1
         self.total_page_faults += 1
-        if self.verbose:
-            print(f"Page fault for page {page_number}")
+        victim_page = None
+        victim_modified = False
         
         # find empty frame
         if self.free_frames:
-            frame = self.free_frames.pop(0)
-            if self.verbose:
-                print(f"Using free frame {frame}")
+            frame = self.free_frames.pop()
         else:
             # evict with random replacement policy
-            frame = self._evict_random_page()
+            frame, victim_page, victim_modified = self._evict_random_page()
             
-        # load page into frame
-        self.page_table[page_number] = {'frame': frame, 'modified': False}
-        if self.verbose:
-            print(f"Loaded page {page_number} into frame {frame}")
+        # load page into frame, modified only if this access is a write
+        self.page_table[page_number] = frame
+        self.resident[frame] = page_number
+        self.modified[frame] = is_write
+        if self.tracer is not None:
+            op = WRITE_MISS if is_write else READ_MISS
+            self.tracer.record(op, page_number, frame, victim_page, victim_modified)
+
+
+    def read_memory(self, page_number):
+        # check for hit
+        frame = self.page_table.get(page_number)
+        if frame is not None:
+            if self.tracer is not None:
+                self.tracer.record(READ_HIT, page_number, frame)
+            return
+        self._page_fault(page_number, False)
     
 
     def write_memory(self, page_number):
-        if self.verbose:
-            print(f"Writing to page {page_number}")
-            
         # check for hit
-        if page_number in self.page_table:
-            self.page_table[page_number]['modified'] = True
-            if self.verbose:
-                frame = self.page_table[page_number]['frame']
-                print(f"Page {page_number} in frame {frame} marked as modified")
+        frame = self.page_table.get(page_number)
+        if frame is not None:
+            self.modified[frame] = True
+            if self.tracer is not None:
+                self.tracer.record(WRITE_HIT, page_number, frame)
             return
-        
-        # miss/page-fault, therefore must be read from disk
-        self.total_page_faults += 1
-        self.total_disk_reads += 1
-
-        if self.verbose:
-            print(f"Page fault for page {page_number} (write)")
-        
-        # find empty frame
-        if self.free_frames:
-            frame = self.free_frames.pop(0)
-            if self.verbose:
-                print(f"Using free frame {frame}")
-        else:
-            # evict with random replacement policy
-            frame = self._evict_random_page()
-            
-        # load page into frame
-        self.page_table[page_number] = {'frame': frame, 'modified': True}
-        if self.verbose:
-            print(f"Loaded page {page_number} into frame {frame} and marked as modified")
+        self._page_fault(page_number, True)
     
 
-    # debug methods
-    def set_debug(self):
-        self.verbose = True
-    def reset_debug(self):
-        self.verbose = False
+    def process_batch(self, pages, is_write):
+        if self.tracer is not None:
+            # per-event path records every access
+            return MMU.process_batch(self, pages, is_write)
+        page_table = self.page_table
+        resident = self.resident
+        modified = self.modified
+        free_frames = self.free_frames
+        randrange = self.rng.randrange
+        n = self.frames
+        faults = 0
+        write_backs = 0
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            frame = page_table.get(page_number)
+            if frame is not None:
+                if write:
+                    modified[frame] = True
+                continue
+            faults += 1
+            if free_frames:
+                frame = free_frames.pop()
+            else:
+                frame = randrange(n)
+                if modified[frame]:
+                    write_backs += 1
+                del page_table[resident[frame]]
+            page_table[page_number] = frame
+            resident[frame] = page_number
+            modified[frame] = write
+        self.total_page_faults += faults
+        self.total_disk_reads += faults
+        self.total_disk_writes += write_backs
+
+
+    def resize(self, frames):
+        # shrinking evicts random resident pages (writing back modified ones) until
+        # the rest fit, then moves them to the lowest frames; growing adds free frames
+        if frames < 1:
+            raise ValueError("Frame number must be at least 1")
+        occupied = [frame for frame in range(self.frames) if self.resident[frame] is not None]
+        while len(occupied) > frames:
+            i = self.rng.randrange(len(occupied))
+            frame = occupied[i]
+            occupied[i] = occupied[-1]
+            occupied.pop()
+            if self.modified[frame]:
+                self.total_disk_writes += 1
+            del self.page_table[self.resident[frame]]
+        occupied.sort()
+        k = len(occupied)
+        self.resident = [self.resident[frame] for frame in occupied] + [None] * (frames - k)
+        self.modified = bytearray(self.modified[frame] for frame in occupied) + bytearray(frames - k)
+        self.page_table = {page_number: frame for frame, page_number in enumerate(self.resident[:k])}
+        self.free_frames = list(range(frames - 1, k - 1, -1))
+        self.frames = frames
 
 
     # stats for memsim.py
@@ -123,4 +148,6 @@ class RandMMU(MMU):
     def get_total_disk_writes(self):
         return self.total_disk_writes
     def get_total_page_faults(self):
-        return self.total_page_faults
\ No newline at end of file
+        return self.total_page_faults
+    def get_resident_dirty_count(self):
+        return self.modified.count(1)
@@ -0,0 +1,101 @@
+'''
+* Persistent store of simulation results.
+* One SQLite row per (trace hash, policy, frames, page offset, seed, code
+* version). The sweep runner looks cells up here first, simulates only the
+* missing ones and writes each result as soon as it arrives, so a crash or an
+* extra trace or metric never means rerunning the whole grid. The code version
+* is a hash of the simulator sources, so results from edited code are not reused.
+*
+'''
+import hashlib
+import os
+import sqlite3
+
+from tracecache import cache_dir
+
+# sources whose behaviour affects results
+_SOURCES = ("mmu.py", "lrummu.py", "clockmmu.py", "randmmu.py", "escmmu.py", "optmmu.py",
+            "arcmmu.py", "carmmu.py", "stackdist.py", "shards.py", "traceio.py", "bintrace.py",
+            "tracecache.py", "sweep.py")
+
+NO_SEED = -1  # stored in place of seed=None; SQLite keys treat NULLs as distinct
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    trace_hash TEXT NOT NULL,
+    policy TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    page_offset INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    code_version TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    disk_reads INTEGER NOT NULL,
+    disk_writes INTEGER NOT NULL,
+    page_faults INTEGER NOT NULL,
+    PRIMARY KEY (trace_hash, policy, frames, page_offset, seed, code_version)
+)
+"""
+
+_version = None
+
+
+def code_version():
+    global _version
+    if _version is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in _SOURCES:
+            path = os.path.join(here, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _version = digest.hexdigest()[:16]
+    return _version
+
+
+def default_path():
+    return os.path.join(cache_dir(), "results.sqlite")
+
+
+class ResultStore:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute(_SCHEMA)
+        self.db.commit()
+        self.version = code_version()
+
+    def lookup(self, trace_hash, policy, frame_counts, page_offset=12, seed=None):
+        """
+        Return {frames: (events, disk_reads, disk_writes, page_faults)} for the
+        requested frame counts that are already stored.
+        """
+        rows = self.db.execute(
+            "SELECT frames, events, disk_reads, disk_writes, page_faults FROM results "
+            "WHERE trace_hash = ? AND policy = ? AND page_offset = ? AND seed = ? AND code_version = ?",
+            (trace_hash, policy, page_offset, NO_SEED if seed is None else seed, self.version))
+        wanted = set(frame_counts)
+        return {row[0]: row[1:] for row in rows if row[0] in wanted}
+
+    def put(self, trace_hash, policy, frames, events, disk_reads, disk_writes, page_faults,
+            page_offset=12, seed=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (trace_hash, policy, frames, page_offset, NO_SEED if seed is None else seed, self.version,
+             events, disk_reads, disk_writes, page_faults))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
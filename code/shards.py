@@ -0,0 +1,309 @@
+'''
+* Sampled LRU miss-ratio curves (SHARDS, Waldspurger et al., FAST '15).
+* A page is tracked when the hash of its number falls below a threshold T, so
+* either every access to a page is seen or none is, and a fraction R = T / 2^24
+* of the pages is followed. Their accesses go through the exact stack-distance
+* engine (stackdist.py). A stack distance d among the sampled pages has d - 1
+* distinct sampled pages between the two accesses, which stand for (d - 1) / R
+* pages of the whole trace, so it counts as distance (d - 1) / R + 1; each
+* sampled access counts 1 / R times. Distances between 1 and 1 / R cannot be
+* told apart, so frame counts below 1 / R are not estimated (see resolution).
+* Fault rates are divided by the exact event count, taking any shortfall in
+* sampled weight as hits (the SHARDS_adj correction). With max_pages set
+* (fixed-size SHARDS) T is lowered whenever more than max_pages pages are
+* tracked and the pages above the new threshold are forgotten, so memory stays
+* bounded however long the trace is; counts are then the sampled share of each
+* outcome. Samplers with different hash salts give independent estimates;
+* their spread is the error bar.
+*
+'''
+from heapq import heappop, heappush
+from math import ceil, sqrt
+import argparse
+
+from mmu import MMU, as_list
+from stackdist import LruStackDistance
+from traceio import TraceFormatError, parse_chunks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_BITS = 24
+MODULUS = 1 << HASH_BITS
+_MULT = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+def page_hash(page_number, salt=0):
+    # 64-bit multiply-xorshift mix; the top HASH_BITS bits are the hash
+    x = ((page_number ^ salt) * _MULT) & _MASK
+    x ^= x >> 31
+    return ((x * _MULT) & _MASK) >> (64 - HASH_BITS)
+
+
+def _scale_distance(distance, threshold):
+    # full-trace stack distance for a sampled one, at sampling threshold threshold
+    return ceil((distance - 1) * MODULUS / threshold) + 1
+
+
+def _hash_array(pages, salt):
+    # page_hash over a uint64 array; NumPy multiplication wraps modulo 2^64 as well
+    x = (pages.astype(np.uint64, copy=False) ^ np.uint64(salt)) * np.uint64(_MULT)
+    x ^= x >> np.uint64(31)
+    return (x * np.uint64(_MULT)) >> np.uint64(64 - HASH_BITS)
+
+
+class _SampledStack(LruStackDistance):
+    # the exact engine, run on sampled pages only, reporting to its sampler
+    def __init__(self, max_frames, sampler):
+        super().__init__(max_frames)
+        self.sampler = sampler
+
+    def _account(self, distance, dirty_from):
+        self.sampler._record(distance, dirty_from)
+
+
+class ShardsStackDistance:
+    def __init__(self, max_frames, rate=0.01, max_pages=None, salt=0):
+        if not 0 < rate <= 1:
+            raise ValueError("sampling rate must be in (0, 1]")
+        self.max_frames = max_frames
+        self.max_pages = max_pages
+        self.salt = salt
+        self.threshold = max(1, round(rate * MODULUS))
+        # distances among sampled pages never need to go past max_frames * rate
+        self.stack = _SampledStack(ceil(max_frames * self.threshold / MODULUS) + 1, self)
+        # tracked pages by hash, largest first, for lowering the threshold
+        self.heap = []
+        # weighted counts in full-trace frame counts, like LruStackDistance's
+        self.hist = [0.0] * (max_frames + 2)
+        self.write_diff = [0.0] * (max_frames + 2)
+        self.cold_misses = 0.0
+        self.events = 0
+        self.sampled = 0
+
+    @property
+    def rate(self):
+        return self.threshold / MODULUS
+
+    def resolution(self):
+        # smallest frame count past 1 that a sampled distance lands on, about 1 / R;
+        # below it every estimate is the 1-frame one
+        return 1 if self.threshold >= MODULUS else _scale_distance(2, self.threshold)
+
+    def _bucket(self, distance):
+        return min(_scale_distance(distance, self.threshold), self.max_frames + 1)
+
+    def _record(self, distance, dirty_from):
+        weight = MODULUS / self.threshold
+        if distance == 0:
+            self.cold_misses += weight
+            return
+        bucket = self._bucket(distance)
+        self.hist[bucket] += weight
+        if dirty_from is not None and dirty_from < distance:
+            self.write_diff[self._bucket(dirty_from)] += weight
+            self.write_diff[bucket] -= weight
+
+    def _lower_threshold(self):
+        # the new threshold is the largest tracked hash; everything at or above it goes
+        stack = self.stack
+        neg_hash, page_number = heappop(self.heap)
+        self.threshold = -neg_hash
+        stack.forget(page_number)
+        while self.heap and -self.heap[0][0] >= self.threshold:
+            stack.forget(heappop(self.heap)[1])
+
+    def process_batch(self, pages, is_write):
+        self.events += len(pages)
+        if np is not None and isinstance(pages, np.ndarray):
+            # drop unsampled events in bulk; the threshold only falls, so this keeps a superset
+            hashes = _hash_array(pages, self.salt)
+            keep = hashes < self.threshold
+            pages = pages[keep].tolist()
+            is_write = np.asarray(is_write)[keep].tolist()
+            hashes = hashes[keep].tolist()
+        else:
+            pages = as_list(pages)
+            is_write = as_list(is_write)
+            hashes = [page_hash(page_number, self.salt) for page_number in pages]
+        stack = self.stack
+        last = stack.last
+        access = stack.access
+        bounded = self.max_pages is not None
+        for page_number, write, h in zip(pages, is_write, hashes):
+            if h >= self.threshold:
+                continue
+            self.sampled += 1
+            if bounded and page_number not in last:
+                heappush(self.heap, (-h, page_number))
+            access(page_number, write)
+            if bounded and len(last) > self.max_pages:
+                self._lower_threshold()
+        stack._maybe_compact()
+
+    def read_memory(self, page_number):
+        self.process_batch([page_number], [False])
+
+    def write_memory(self, page_number):
+        self.process_batch([page_number], [True])
+
+    def _final_write_diff(self):
+        diff = list(self.write_diff)
+        weight = MODULUS / self.threshold
+        for m, distance in self.stack._dirty_at_end():
+            diff[self._bucket(m)] += weight
+            diff[self._bucket(distance)] -= weight
+        return diff
+
+    def curve(self):
+        """
+        Estimated [(frames, disk_reads, disk_writes, page_faults), ...] for
+        1..max_frames, as floats.
+        """
+        results = []
+        # fixed rate: the sampled weight missing from (or exceeding) the event count is
+        # put down to hits at the smallest distance, which leaves the counts as they are.
+        # Fixed size: weights changed along the way, so use the sampled share of each
+        # outcome instead
+        scale = 1.0
+        mass = self.cold_misses + sum(self.hist)
+        if self.max_pages is not None and mass:
+            scale = self.events / mass
+        faults = self.cold_misses + sum(self.hist[2:])
+        writes = 0.0
+        write_diff = self._final_write_diff()
+        for frames in range(1, self.max_frames + 1):
+            writes += write_diff[frames]
+            estimate = min(faults * scale, self.events)
+            results.append((frames, estimate, min(writes * scale, estimate), estimate))
+            faults -= self.hist[frames + 1]
+        return results
+
+
+class ShardsMMU(MMU):
+    """
+    Several independent samplers run as one MMU-like engine. Getters report the
+    mean estimate for `frames`, rounded; get_fault_rate_error gives the spread.
+    Estimates only mean something from resolution() frames up.
+    """
+    def __init__(self, frames, rate=0.01, max_pages=None, replicas=4):
+        if replicas < 1:
+            raise ValueError("at least one sampler is needed")
+        self.num_frames = frames
+        self.samplers = [ShardsStackDistance(frames, rate, max_pages, salt=page_hash(i, 0x5bd1e995))
+                         for i in range(replicas)]
+        self._curves = None
+
+    def resolution(self):
+        # fixed-size samplers lower their rate as they go, so take the coarsest
+        return max(sampler.resolution() for sampler in self.samplers)
+
+    def process_batch(self, pages, is_write):
+        for sampler in self.samplers:
+            sampler.process_batch(pages, is_write)
+        self._curves = None
+
+    def read_memory(self, page_number):
+        self.process_batch([page_number], [False])
+
+    def write_memory(self, page_number):
+        self.process_batch([page_number], [True])
+
+    def _estimates(self, frames):
+        if self._curves is None:
+            self._curves = [sampler.curve() for sampler in self.samplers]
+        return [curve[frames - 1] for curve in self._curves]
+
+    def curve(self):
+        """
+        [(frames, disk_reads, disk_writes, page_faults, fault_rate_error), ...]
+        averaged over the samplers, for resolution()..frames.
+        """
+        return [(frames, *(round(v) for v in self._mean(frames)), self.get_fault_rate_error(frames))
+                for frames in range(self.resolution(), self.num_frames + 1)]
+
+    def _mean(self, frames):
+        rows = self._estimates(frames)
+        return [sum(row[k] for row in rows) / len(rows) for k in (1, 2, 3)]
+
+    def get_fault_rate_error(self, frames=None):
+        # standard error of the mean fault rate across the samplers
+        rows = self._estimates(frames or self.num_frames)
+        events = self.samplers[0].events
+        if len(rows) < 2 or not events:
+            return 0.0
+        mean = sum(row[3] for row in rows) / len(rows)
+        variance = sum((row[3] - mean) ** 2 for row in rows) / (len(rows) - 1)
+        return sqrt(variance / len(rows)) / events
+
+    def get_total_disk_reads(self, frames=None):
+        return round(self._mean(frames or self.num_frames)[0])
+
+    def get_total_disk_writes(self, frames=None):
+        return round(self._mean(frames or self.num_frames)[1])
+
+    def get_total_page_faults(self, frames=None):
+        return round(self._mean(frames or self.num_frames)[2])
+
+
+def main():
+    PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+    parser = argparse.ArgumentParser(description="Approximate LRU miss-ratio curve by hash sampling.")
+    parser.add_argument("inputfile")
+    parser.add_argument("maxframes", type=int)
+    parser.add_argument("--rate", type=float, default=0.01, help="(starting) sampling rate")
+    parser.add_argument("--max-pages", type=int, default=None, help="bound on tracked pages (fixed-size)")
+    parser.add_argument("--replicas", type=int, default=4, help="independent samplers for the error bar")
+    parser.add_argument("--check", action="store_true", help="also run the exact engine and report the error")
+    args = parser.parse_args()
+
+    if args.maxframes < 1:
+        print("Frame number must be at least 1\n")
+        return
+    try:
+        mmu = ShardsMMU(args.maxframes, args.rate, args.max_pages, args.replicas)
+    except ValueError as e:
+        print(e)
+        return
+    # the exact engine matches LruMMU at every frame count
+    exact = LruStackDistance(args.maxframes) if args.check else None
+    try:
+        for pages, writes in parse_chunks(args.inputfile, PAGE_OFFSET):
+            mmu.process_batch(pages, writes)
+            if exact is not None:
+                exact.process_batch(pages, writes)
+    except FileNotFoundError:
+        print(f"Input '{args.inputfile}' could not be found")
+        return
+    except TraceFormatError as e:
+        print(e)
+        return
+
+    events = mmu.samplers[0].events
+    if not events:
+        return
+    if mmu.resolution() > 1:
+        print(f"frame counts below {mmu.resolution()} are not resolved at this sampling rate")
+    errors = []
+    exact_curve = exact.curve() if exact is not None else None
+    for frames, reads, writes, faults, error in mmu.curve():
+        line = f"frames={frames},reads={reads},writes={writes},faults={faults}," \
+               f"fault_rate={faults / events:.4f},error=±{error:.4f}"
+        if exact_curve is not None:
+            exact_rate = exact_curve[frames - 1][3] / events
+            errors.append(abs(faults / events - exact_rate))
+            line += f",exact_fault_rate={exact_rate:.4f}"
+        print(line)
+    rate = min(sampler.rate for sampler in mmu.samplers)
+    tracked = max(len(sampler.stack.last) for sampler in mmu.samplers)
+    print(f"sampling rate {rate:.6f}, up to {tracked} pages tracked per sampler")
+    if errors:
+        print(f"fault rate error vs exact: mean {sum(errors) / len(errors):.5f}, max {max(errors):.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+'''
+* One-pass LRU miss-ratio curve engine.
+* LRU has the inclusion property: a page hits in a cache of f frames exactly
+* when its stack distance (number of distinct pages touched since its last use,
+* plus one) is at most f. Stack distances are counted with a Fenwick tree over
+* the time index of each page's most recent access, so every event is O(log n)
+* and a single pass over the trace gives disk reads, disk writes and page faults
+* for every frame count from 1 to max_frames.
+*
+'''
+import sys
+
+from mmu import as_list
+from traceio import TraceFormatError, parse_chunks, replay
+
+
+class _Fenwick:
+    # binary indexed tree over time slots 1..size holding 0/1 "last access" markers
+    def __init__(self, size=1024):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.marks = bytearray(size + 1)
+
+    @classmethod
+    def filled(cls, count):
+        # tree with markers in slots 1..count, room to grow to twice that
+        size = 1024
+        while size < 2 * count:
+            size *= 2
+        tree = cls(size)
+        tree.marks[1:count + 1] = b"\x01" * count
+        tree._rebuild()
+        return tree
+
+    def _rebuild(self):
+        # linear-time rebuild from the marker array
+        size = self.size
+        tree = list(self.marks)
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def _grow(self, needed):
+        size = self.size
+        while size < needed:
+            size *= 2
+        self.marks.extend(bytes(size - self.size))
+        self.size = size
+        self._rebuild()
+
+    def add(self, i, delta):
+        if i > self.size:
+            self._grow(i)
+        self.marks[i] += delta
+        tree = self.tree
+        size = self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        # sum of markers in slots 1..i
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+class LruStackDistance:
+    def __init__(self, max_frames):
+        self.max_frames = max_frames
+        # page -> time slot of its most recent access
+        self.last = {}
+        # page -> largest stack distance seen since the page was last written
+        # (0 right after a write, absent if the page has never been written)
+        self.dirty_from = {}
+        self.tree = _Fenwick()
+        self.time = 0
+        # hist[d] = accesses with stack distance d (d == max_frames + 1 means "further")
+        self.hist = [0] * (max_frames + 2)
+        # write-backs as a difference array over frame counts
+        self.write_diff = [0] * (max_frames + 2)
+        self.cold_misses = 0
+        self.events = 0
+        # write_diff with end-of-trace evictions folded in, cached per time step
+        self._final_diff = None
+        self._final_at = -1
+
+    def _account(self, distance, dirty_from):
+        """
+        Record one access. distance is the capped stack distance (0 for a cold miss),
+        dirty_from the smallest frame count in which the page was dirty when this
+        access found it evicted (None if it was clean in every cache size).
+        """
+        if distance == 0:
+            self.cold_misses += 1
+            return
+        self.hist[distance] += 1
+        # evicted in every cache smaller than distance; dirty in those >= dirty_from
+        if dirty_from is not None and dirty_from < distance:
+            self.write_diff[dirty_from] += 1
+            self.write_diff[distance] -= 1
+
+    def access(self, page_number, is_write):
+        self.events += 1
+        self.time += 1
+        t = self.time
+        tree = self.tree
+        cap = self.max_frames + 1
+        prev = self.last.get(page_number)
+        if prev is None:
+            distance = 0
+            dirty_from = None
+        else:
+            # distinct pages whose last access falls after prev, plus this page
+            distance = len(self.last) - tree.prefix(prev) + 1
+            if distance > cap:
+                distance = cap
+            m = self.dirty_from.get(page_number)
+            dirty_from = None if m is None else max(m, 1)
+            tree.add(prev, -1)
+        self._account(distance, dirty_from)
+        tree.add(t, 1)
+        self.last[page_number] = t
+        if is_write:
+            self.dirty_from[page_number] = 0
+        elif dirty_from is not None and distance > dirty_from:
+            # reloaded clean in every cache the page missed in
+            self.dirty_from[page_number] = distance
+
+    def forget(self, page_number):
+        # drop a page as if it had never been accessed
+        t = self.last.pop(page_number, None)
+        if t is not None:
+            self.tree.add(t, -1)
+        self.dirty_from.pop(page_number, None)
+
+    def compact(self):
+        # renumber the time slots 1..n in access order, so the tree is sized by the
+        # distinct pages rather than by the length of the trace
+        order = sorted(self.last, key=self.last.get)
+        self.last = {page: t for t, page in enumerate(order, start=1)}
+        self.tree = _Fenwick.filled(len(order))
+        self.time = len(order)
+        self._final_at = -1
+
+    def _maybe_compact(self):
+        # once the time index has run well past the distinct pages, renumber it
+        if self.time > 4 * len(self.last) + 4096:
+            self.compact()
+
+    def read_memory(self, page_number):
+        self.access(page_number, False)
+
+    def write_memory(self, page_number):
+        self.access(page_number, True)
+
+    def process_batch(self, pages, is_write):
+        access = self.access
+        for page_number, write in zip(as_list(pages), as_list(is_write)):
+            access(page_number, write)
+        self._maybe_compact()
+
+    def _dirty_at_end(self):
+        # pages still dirty at the end of the trace were written back in every cache
+        # size that has evicted them since; their stack position is their distance "now".
+        # Yields (dirty_from, distance) for each such write-back range
+        cap = self.max_frames + 1
+        distinct = len(self.last)
+        prefix = self.tree.prefix
+        for page_number, m in self.dirty_from.items():
+            distance = min(distinct - prefix(self.last[page_number]) + 1, cap)
+            m = max(m, 1)
+            if m < distance:
+                yield m, distance
+
+    def _final_write_diff(self):
+        if self._final_at == self.time:
+            return self._final_diff
+        diff = list(self.write_diff)
+        for m, distance in self._dirty_at_end():
+            diff[m] += 1
+            diff[distance] -= 1
+        self._final_diff = diff
+        self._final_at = self.time
+        return diff
+
+    def get_total_page_faults(self, frames):
+        return self.cold_misses + sum(self.hist[frames + 1:])
+
+    def get_total_disk_reads(self, frames):
+        # every fault reads the page in from disk
+        return self.get_total_page_faults(frames)
+
+    def get_total_disk_writes(self, frames):
+        return sum(self._final_write_diff()[1:frames + 1])
+
+    def curve(self):
+        """
+        Return [(frames, disk_reads, disk_writes, page_faults), ...] for 1..max_frames.
+        """
+        results = []
+        faults = self.cold_misses + sum(self.hist[2:])
+        writes = 0
+        write_diff = self._final_write_diff()
+        for frames in range(1, self.max_frames + 1):
+            writes += write_diff[frames]
+            results.append((frames, faults, writes, faults))
+            if frames + 1 < len(self.hist):
+                faults -= self.hist[frames + 1]
+        return results
+
+
+def main():
+    PAGE_OFFSET = 12  # page is 2^12 = 4KB
+
+    if len(sys.argv) < 3:
+        print("Usage: python stackdist.py inputfile maxframes")
+        return
+
+    input_file = sys.argv[1]
+    max_frames = int(sys.argv[2])
+    if max_frames < 1:
+        print("Frame number must be at least 1\n")
+        return
+
+    engine = LruStackDistance(max_frames)
+    try:
+        for pages, writes in parse_chunks(input_file, PAGE_OFFSET):
+            replay(engine, pages, writes)
+    except FileNotFoundError:
+        print(f"Input '{input_file}' could not be found")
+        return
+    except TraceFormatError as e:
+        print(e)
+        return
+
+    for frames, reads, writes, faults in engine.curve():
+        rate = faults / engine.events if engine.events else 0.0
+        print(f"frames={frames},reads={reads},writes={writes},faults={faults},fault_rate={rate:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+'''
+* In-process parallel experiment runner.
+* Each trace is parsed once, placed in shared memory, and the (policy, frames)
+* grid is run across a process pool that attaches to those segments instead of
+* re-reading the trace. LRU curves come from a single stack-distance pass per
+* trace (see stackdist.py), and "shards" estimates them from a sample of the
+* pages (see shards.py). Results are returned as SweepResult records and,
+* given a ResultStore (resultstore.py), cells computed before are not rerun.
+*
+'''
+from array import array
+from collections import namedtuple
+from multiprocessing import Pool, shared_memory
+import argparse
+import os
+
+from arcmmu import ArcMMU
+from carmmu import CarMMU
+from clockmmu import ClockMMU
+from escmmu import EscMMU
+from lrummu import LruMMU
+from optmmu import OptMMU, build_next_use
+from randmmu import RandMMU
+from shards import ShardsMMU
+from stackdist import LruStackDistance
+from resultstore import ResultStore
+from tracecache import load_cached, trace_digest
+from traceio import REDUCE_UNSAFE, TraceFormatError, reduce_arrays, replay
+
+POLICIES = {
+    "rand": RandMMU,
+    "lru": LruMMU,
+    "clock": ClockMMU,
+    "arc": ArcMMU,
+    "car": CarMMU,
+    "esc": EscMMU,
+    "opt": OptMMU,
+    "shards": ShardsMMU,
+}
+
+SweepResult = namedtuple("SweepResult", "trace policy frames events disk_reads disk_writes page_faults")
+
+
+# policies whose results depend on the seed; shards hashes with fixed salts
+SEEDED = ("rand",)
+
+
+def make_mmu(policy, frames, seed=None):
+    # only the rand policy takes a seed
+    if policy in SEEDED:
+        return RandMMU(frames, seed=seed)
+    return POLICIES[policy](frames)
+
+
+def _reduced(policy):
+    # whether policy runs on the run-folded stream: shards counts the events it
+    # samples from, so it needs the original ones
+    return policy not in REDUCE_UNSAFE and policy != "shards"
+
+
+# worker-side state: (trace, reduced) -> (pages list, writes list, original event
+# count), filled lazily from shared memory
+_segments = {}
+_decoded = {}
+_next_use = {}
+
+
+def _share_trace(path, page_offset, reduced=True):
+    # one segment per trace: n little-endian u64 pages followed by n write bytes.
+    # If reduced, runs of accesses to one page are folded first, which changes no
+    # result for the policies _reduced allows
+    pages, writes = load_cached(path, page_offset)
+    events = len(pages)
+    if reduced:
+        pages, writes, _ = reduce_arrays(pages, writes)
+    n = len(pages)
+    shm = shared_memory.SharedMemory(create=True, size=max(n * 9, 1))
+    if hasattr(pages, 'astype'):
+        shm.buf[:n * 8] = pages.astype('<u8').tobytes()
+        shm.buf[n * 8:n * 9] = writes.astype('u1').tobytes()
+    else:
+        shm.buf[:n * 8] = array('Q', pages).tobytes()
+        shm.buf[n * 8:n * 9] = bytes(writes)
+    return shm, n, events
+
+
+def _init_worker(segments):
+    _segments.update(segments)
+
+
+def _events(trace):
+    if trace not in _decoded:
+        name, n, events = _segments[trace]
+        shm = shared_memory.SharedMemory(name=name)
+        pages = shm.buf[:n * 8].cast('Q').tolist()
+        writes = [b != 0 for b in shm.buf[n * 8:n * 9]]
+        shm.close()
+        _decoded[trace] = (pages, writes, events)
+    return _decoded[trace]
+
+
+def _store_policy(policy, sample_rate):
+    # sampled curves are stored per sampling rate
+    return f"shards:{sample_rate}" if policy == "shards" else policy
+
+
+def _store_seed(policy, seed):
+    # deterministic policies are stored once, whatever the seed
+    return seed if policy in SEEDED else None
+
+
+def _run_task(task):
+    trace, policy, frame_counts, seed, sample_rate = task
+    pages, writes, events = _events((trace, _reduced(policy)))
+    if policy in ("lru", "shards"):
+        # inclusion property: one pass gives every frame count
+        if policy == "lru":
+            engine = LruStackDistance(max(frame_counts))
+        else:
+            engine = ShardsMMU(max(frame_counts), sample_rate)
+        replay(engine, pages, writes)
+        wanted = set(frame_counts)
+        return [SweepResult(trace, policy, row[0], events, *row[1:4])
+                for row in engine.curve() if row[0] in wanted]
+    if policy == "opt" and trace not in _next_use:
+        # shared by every OPT run on this trace in this worker
+        _next_use[trace] = build_next_use(pages)
+    results = []
+    for frames in frame_counts:
+        if policy == "opt":
+            mmu = OptMMU(frames, next_use=_next_use[trace])
+        else:
+            mmu = make_mmu(policy, frames, seed)
+        replay(mmu, pages, writes)
+        results.append(SweepResult(trace, policy, frames, events, mmu.get_total_disk_reads(),
+                                   mmu.get_total_disk_writes(), mmu.get_total_page_faults()))
+    return results
+
+
+def run_sweep(traces, policies, frame_counts, workers=None, page_offset=12, seed=None, store=None,
+              sample_rate=0.01):
+    """
+    Run every (trace, policy, frames) combination and return a list of
+    SweepResult records ordered by trace, policy and frames. With a seed, every
+    rand run uses that seed, so results do not depend on how tasks are scheduled.
+    With a ResultStore, stored cells are reused and only missing ones are
+    simulated; each new result is written as soon as it arrives. Only rand
+    results are stored per seed, and unseeded rand runs are never stored, since
+    they are not reproducible. The "shards" policy
+    samples pages at sample_rate and has no rows below the frame count that
+    rate resolves (ShardsMMU.resolution).
+    """
+    frame_counts = list(frame_counts)
+    for policy in policies:
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid replacement mode '{policy}'")
+    if "shards" in policies and not 0 < sample_rate <= 1:
+        raise ValueError("sampling rate must be in (0, 1]")
+
+    results = []
+    tasks = []
+    digests = {}
+    for trace in traces:
+        if store is not None:
+            digests[trace] = trace_digest(trace)
+        for policy in policies:
+            missing = frame_counts
+            if store is not None and not (policy in SEEDED and seed is None):
+                found = store.lookup(digests[trace], _store_policy(policy, sample_rate), frame_counts,
+                                     page_offset, _store_seed(policy, seed))
+                results.extend(SweepResult(trace, policy, frames, *found[frames]) for frames in found)
+                missing = [frames for frames in frame_counts if frames not in found]
+            if not missing:
+                continue
+            if policy in ("lru", "shards"):
+                tasks.append((trace, policy, missing, seed, sample_rate))
+            else:
+                tasks.extend((trace, policy, [frames], seed, sample_rate) for frames in missing)
+
+    shared = {}
+    try:
+        # only traces with cells left to compute are loaded, unreduced only where _reduced says so
+        for key in dict.fromkeys((task[0], _reduced(task[1])) for task in tasks):
+            shared[key] = _share_trace(key[0], page_offset, key[1])
+        segments = {key: (shm.name, n, events) for key, (shm, n, events) in shared.items()}
+
+        if tasks:
+            with Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(segments,)) as pool:
+                for chunk in pool.imap_unordered(_run_task, tasks):
+                    results.extend(chunk)
+                    if store is not None:
+                        for r in chunk:
+                            if not (r.policy in SEEDED and seed is None):
+                                store.put(digests[r.trace], _store_policy(r.policy, sample_rate), r.frames,
+                                          r.events, r.disk_reads, r.disk_writes, r.page_faults, page_offset,
+                                          _store_seed(r.policy, seed))
+                        store.commit()
+    finally:
+        for shm, _, _ in shared.values():
+            shm.close()
+            shm.unlink()
+
+    order = {trace: i for i, trace in enumerate(traces)}
+    policy_order = {policy: i for i, policy in enumerate(policies)}
+    results.sort(key=lambda r: (order[r.trace], policy_order[r.policy], r.frames))
+    return results
+
+
+def _parse_frames(spec):
+    # "1-99", "4,8,16" or a mix of both
+    frame_counts = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            frame_counts.extend(range(int(lo), int(hi) + 1))
+        else:
+            frame_counts.append(int(part))
+    return frame_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a (policy, frames) sweep over one or more traces.")
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--policies", default="rand,lru,clock")
+    parser.add_argument("--frames", default="1-99", help="e.g. 1-99 or 4,8,16")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None, help="seed for the rand policy")
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="sampling rate for the shards policy")
+    parser.add_argument("--store", default=None, help="results database (default: in the trace cache dir)")
+    parser.add_argument("--no-store", action="store_true", help="always simulate, never read or write results")
+    args = parser.parse_args()
+
+    frame_counts = _parse_frames(args.frames)
+    if min(frame_counts) < 1:
+        print("Frame number must be at least 1\n")
+        return
+    store = None if args.no_store else ResultStore(args.store)
+    try:
+        results = run_sweep(args.traces, args.policies.split(","), frame_counts, args.workers,
+                            seed=args.seed, store=store, sample_rate=args.sample_rate)
+    except FileNotFoundError as e:
+        print(f"Input '{e.filename}' could not be found")
+        return
+    except (TraceFormatError, ValueError) as e:
+        print(e)
+        return
+    finally:
+        if store is not None:
+            store.close()
+
+    print(",".join(SweepResult._fields))
+    for r in results:
+        print(",".join(str(v) for v in r))
+
+
+if __name__ == "__main__":
+    main()
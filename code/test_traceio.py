@@ -0,0 +1,20 @@
+import io
+
+import pytest
+
+import traceio
+from traceio import TraceFormatError, parse_chunks
+
+
+def test_blank_lines_fall_back_to_the_line_parser():
+    pytest.importorskip("numpy")
+    block = b"\n" * 8
+    assert traceio._parse_block_np(block, 12) is None
+    with pytest.raises(TraceFormatError, match="line 1"):
+        list(parse_chunks(io.BytesIO(block)))
+
+
+def test_short_lines_fall_back_to_the_line_parser():
+    pytest.importorskip("numpy")
+    assert traceio._parse_block_np(b"1\n2\n", 12) is None
+    assert traceio._parse_block_np(b"1 \n2 \n", 12) is None
@@ -0,0 +1,157 @@
+'''
+* On-disk cache of parsed traces.
+* Decoded page/write arrays are stored as binary traces (see bintrace.py) in a
+* cache directory, keyed by the SHA-256 of the trace contents and PAGE_OFFSET,
+* so a changed trace never hits a stale entry. A small stat index
+* (path, size, mtime) -> digest avoids re-hashing unchanged files. Entries are
+* evicted least-recently-used first once the cache outgrows its size cap.
+* Location: $MEMSIM_CACHE_DIR, else $XDG_CACHE_HOME/memsim, else ~/.cache/memsim.
+*
+'''
+import hashlib
+import json
+import os
+import sys
+
+from bintrace import is_binary_trace, write_arrays
+from traceio import load_arrays
+
+DEFAULT_MAX_BYTES = 2 << 30  # 2GB
+INDEX_NAME = "index.json"
+
+
+def cache_dir():
+    path = os.environ.get("MEMSIM_CACHE_DIR")
+    if path is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "memsim")
+    return path
+
+
+def _max_bytes():
+    return int(os.environ.get("MEMSIM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+
+def _load_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_NAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_index(directory, index):
+    tmp = os.path.join(directory, f"{INDEX_NAME}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(directory, INDEX_NAME))
+
+
+def content_hash(path):
+    # SHA-256 of the trace file, read in 1MB blocks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _digest(directory, path):
+    # reuse the stored digest while the file's size and mtime are unchanged
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    index = _load_index(directory)
+    entry = index.get(key)
+    if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+    digest = content_hash(path)
+    index[key] = [st.st_size, st.st_mtime_ns, digest]
+    _save_index(directory, index)
+    return digest
+
+
+def trace_digest(path):
+    """
+    Content hash of a trace, reusing the stat index when the file is unchanged.
+    """
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    return _digest(directory, path)
+
+
+def _evict(directory, keep):
+    # least-recently-used first: entries are touched on every hit
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".btr"):
+            full = os.path.join(directory, name)
+            st = os.stat(full)
+            entries.append((st.st_mtime, st.st_size, full))
+    total = sum(size for _, size, _ in entries)
+    limit = _max_bytes()
+    for _, size, full in sorted(entries):
+        if total <= limit:
+            break
+        if full != keep:
+            os.remove(full)
+            total -= size
+
+
+def load_cached(path, page_offset=12):
+    """
+    Like traceio.load_arrays, but served from the cache when this exact trace
+    content has been decoded before with the same page offset.
+    """
+    if not isinstance(path, str) or path == "-" or is_binary_trace(path):
+        # streams cannot be hashed up front; binary traces need no decoding
+        return load_arrays(path, page_offset)
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    entry = os.path.join(directory, f"{_digest(directory, path)}-{page_offset}.btr")
+    if os.path.exists(entry):
+        os.utime(entry)
+        return load_arrays(entry, page_offset)
+    pages, writes = load_arrays(path, page_offset)
+    tmp = f"{entry}.{os.getpid()}.tmp"
+    write_arrays(tmp, pages, writes, page_offset)
+    os.replace(tmp, entry)
+    _evict(directory, entry)
+    return pages, writes
+
+
+def clear():
+    directory = cache_dir()
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    for name in os.listdir(directory):
+        if name.endswith(".btr") or name == INDEX_NAME:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("warm", "clear", "info"):
+        print("Usage: python tracecache.py [warm inputfile... | clear | info]")
+        return
+
+    if sys.argv[1] == "clear":
+        print(f"removed {clear()} files from {cache_dir()}")
+    elif sys.argv[1] == "info":
+        directory = cache_dir()
+        names = [n for n in os.listdir(directory) if n.endswith(".btr")] if os.path.isdir(directory) else []
+        size = sum(os.path.getsize(os.path.join(directory, n)) for n in names)
+        print(f"{directory}: {len(names)} traces, {size} bytes (cap {_max_bytes()})")
+    else:
+        for path in sys.argv[2:]:
+            try:
+                pages, _ = load_cached(path)
+            except FileNotFoundError:
+                print(f"Input '{path}' could not be found")
+                continue
+            print(f"cached {path}: {len(pages)} events")
+
+
+if __name__ == "__main__":
+    main()
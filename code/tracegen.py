@@ -0,0 +1,246 @@
+'''
+* Synthetic workload generator.
+* Streams page references drawn from a mix of access patterns:
+*   zipf     a hot set of pages with Zipf-distributed popularity
+*   scan     one long sequential pass over a region
+*   loop     a region revisited cyclically, e.g. slightly larger than memory
+*   uniform  pages drawn uniformly from the whole address space
+* Every phase_events events the hot set and loop move to new places, giving
+* phase changes. Each event is a write with probability write_ratio.
+* Events are produced a block at a time and written straight out as a text or
+* binary trace, so traces of 100M+ events never sit in memory. The output is
+* fixed by the seed (with NumPy installed, a NumPy generator is used, so the
+* trace differs from the one the pure Python fallback produces).
+*
+'''
+from bisect import bisect
+from itertools import accumulate
+import argparse
+import random
+import sys
+
+from bintrace import BinaryTraceWriter
+from traceio import CHUNK_EVENTS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COMPONENTS = ("zipf", "scan", "loop", "uniform")
+DEFAULT_MIX = "zipf=0.6,scan=0.15,loop=0.15,uniform=0.1"
+
+_HEX = b"0123456789abcdef"
+
+
+def parse_mix(spec):
+    # "zipf=0.6,scan=0.2,..." -> weights in COMPONENTS order, normalised
+    weights = dict.fromkeys(COMPONENTS, 0.0)
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in weights:
+            raise ValueError(f"Unknown access pattern '{name}'. Valid options are [{', '.join(COMPONENTS)}]")
+        weights[name] = float(weight)
+    total = sum(weights.values())
+    if total <= 0 or min(weights.values()) < 0:
+        raise ValueError("pattern weights must be non-negative and not all zero")
+    return [weights[name] / total for name in COMPONENTS]
+
+
+class Workload:
+    def __init__(self, mix=DEFAULT_MIX, hot_pages=4096, zipf_alpha=1.0, scan_pages=1 << 16,
+                 loop_pages=1100, space_pages=1 << 20, phase_events=1000000, write_ratio=0.3, seed=1):
+        self.mix = parse_mix(mix) if isinstance(mix, str) else list(mix)
+        self.hot_pages = hot_pages
+        self.scan_pages = scan_pages
+        self.loop_pages = loop_pages
+        self.space_pages = space_pages
+        self.phase_events = phase_events
+        self.write_ratio = write_ratio
+        self.seed = seed
+        if max(hot_pages, scan_pages, loop_pages) > space_pages:
+            raise ValueError("pattern regions must fit in the address space")
+        if min(hot_pages, scan_pages, loop_pages, phase_events) < 1:
+            raise ValueError("pattern sizes and phase length must be positive")
+        # popularity of rank k is 1/k^alpha; ranks are scattered over the hot region
+        weights = [1 / k ** zipf_alpha for k in range(1, hot_pages + 1)]
+        total = sum(weights)
+        if np is not None:
+            self.rng = np.random.Generator(np.random.PCG64(seed))
+            self._mix_cdf = np.cumsum(self.mix)
+            self._zipf_cdf = np.cumsum(weights) / total
+            self._zipf_rank = self.rng.permutation(hot_pages).astype(np.uint64)
+        else:
+            self.rng = random.Random(seed)
+            self._mix_cdf = list(accumulate(self.mix))
+            self._zipf_cdf = [c / total for c in accumulate(weights)]
+            self._zipf_rank = list(range(hot_pages))
+            self.rng.shuffle(self._zipf_rank)
+        self.scan_base = self._place(scan_pages)
+        self.scan_pos = 0
+        self.loop_pos = 0
+        self._new_phase()
+
+    def _place(self, size):
+        # random start of a region of size pages inside the address space
+        if np is not None:
+            return int(self.rng.integers(0, self.space_pages - size + 1))
+        return self.rng.randrange(self.space_pages - size + 1)
+
+    def _new_phase(self):
+        self.hot_base = self._place(self.hot_pages)
+        self.loop_base = self._place(self.loop_pages)
+        self.phase_left = self.phase_events
+
+    def _block_np(self, n):
+        rng = self.rng
+        which = np.searchsorted(self._mix_cdf, rng.random(n), side='right')
+        np.minimum(which, len(COMPONENTS) - 1, out=which)
+        pages = np.empty(n, dtype=np.uint64)
+        for component in range(len(COMPONENTS)):
+            where = np.flatnonzero(which == component)
+            k = len(where)
+            if k == 0:
+                continue
+            if component == 0:
+                rank = np.searchsorted(self._zipf_cdf, rng.random(k), side='right')
+                np.minimum(rank, self.hot_pages - 1, out=rank)
+                pages[where] = self._zipf_rank[rank] + np.uint64(self.hot_base)
+            elif component == 1:
+                pages[where] = (self.scan_pos + np.arange(k, dtype=np.uint64)) % np.uint64(self.scan_pages) \
+                    + np.uint64(self.scan_base)
+                self.scan_pos += k
+            elif component == 2:
+                pages[where] = (self.loop_pos + np.arange(k, dtype=np.uint64)) % np.uint64(self.loop_pages) \
+                    + np.uint64(self.loop_base)
+                self.loop_pos += k
+            else:
+                pages[where] = rng.integers(0, self.space_pages, k, dtype=np.uint64)
+        return pages, rng.random(n) < self.write_ratio
+
+    def _block_py(self, n):
+        rng = self.rng
+        mix_cdf = self._mix_cdf
+        last = len(COMPONENTS) - 1
+        pages = []
+        writes = []
+        for _ in range(n):
+            component = min(bisect(mix_cdf, rng.random()), last)
+            if component == 0:
+                rank = min(bisect(self._zipf_cdf, rng.random()), self.hot_pages - 1)
+                page = self.hot_base + self._zipf_rank[rank]
+            elif component == 1:
+                page = self.scan_base + self.scan_pos % self.scan_pages
+                self.scan_pos += 1
+            elif component == 2:
+                page = self.loop_base + self.loop_pos % self.loop_pages
+                self.loop_pos += 1
+            else:
+                page = rng.randrange(self.space_pages)
+            pages.append(page)
+            writes.append(rng.random() < self.write_ratio)
+        return pages, writes
+
+    def blocks(self, events, block_events=CHUNK_EVENTS):
+        """
+        Yield (pages, writes) blocks, NumPy arrays or lists, totalling events.
+        """
+        make = self._block_np if np is not None else self._block_py
+        while events > 0:
+            n = min(events, block_events, self.phase_left)
+            yield make(n)
+            events -= n
+            self.phase_left -= n
+            if self.phase_left == 0:
+                self._new_phase()
+
+
+def _text_np(pages, writes, page_offset, digits, rng):
+    # format "<hex address> <R|W>\n" rows as one byte matrix, no per-line Python
+    offsets = rng.integers(0, 1 << page_offset, len(pages), dtype=np.uint64) & np.uint64(~3 & ((1 << page_offset) - 1))
+    addresses = (pages << np.uint64(page_offset)) | offsets
+    hex_digits = np.frombuffer(_HEX, dtype=np.uint8)
+    rows = np.empty((len(pages), digits + 3), dtype=np.uint8)
+    for j in range(digits):
+        shift = np.uint64(4 * (digits - 1 - j))
+        rows[:, j] = hex_digits[((addresses >> shift) & np.uint64(15)).astype(np.intp)]
+    rows[:, digits] = ord(" ")
+    rows[:, digits + 1] = np.where(writes, ord("W"), ord("R"))
+    rows[:, digits + 2] = ord("\n")
+    return rows.tobytes()
+
+
+def _text_py(pages, writes, page_offset, digits, rng):
+    mask = (1 << page_offset) - 4
+    return "".join(f"{page << page_offset | rng.getrandbits(page_offset) & mask:0{digits}x} "
+                   f"{'W' if is_write else 'R'}\n"
+                   for page, is_write in zip(pages, writes)).encode()
+
+
+def write_trace(out, workload, events, page_offset=12, binary=False):
+    """
+    Write events from workload to out (a path, or "-" for stdout as text).
+    Returns the number of events written.
+    """
+    if binary:
+        width = 4 if workload.space_pages <= 1 << 32 else 8
+        with BinaryTraceWriter(out, page_offset, width) as writer:
+            for pages, writes in workload.blocks(events):
+                writer.append(pages, writes)
+            return writer.count
+    # 8 hex digits, like the application traces, while addresses fit in 32 bits
+    digits = 8 if workload.space_pages << page_offset <= 1 << 32 else 16
+    # in-page offsets come from their own generator, so text and binary traces
+    # of one seed hold the same pages
+    if np is not None:
+        fmt, rng = _text_np, np.random.Generator(np.random.PCG64([workload.seed, 1]))
+    else:
+        fmt, rng = _text_py, random.Random(f"{workload.seed}-offsets")
+    dst = sys.stdout.buffer if out == "-" else open(out, 'wb')
+    count = 0
+    try:
+        for pages, writes in workload.blocks(events):
+            dst.write(fmt(pages, writes, page_offset, digits, rng))
+            count += len(pages)
+    finally:
+        if dst is not sys.stdout.buffer:
+            dst.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic memory trace.")
+    parser.add_argument("outputfile", help='"-" writes a text trace to stdout')
+    parser.add_argument("events", type=int)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"pattern weights (default {DEFAULT_MIX})")
+    parser.add_argument("--hot-pages", type=int, default=4096, help="size of the Zipf hot set")
+    parser.add_argument("--zipf-alpha", type=float, default=1.0, help="Zipf skew of the hot set")
+    parser.add_argument("--scan-pages", type=int, default=1 << 16, help="length of the sequential scan")
+    parser.add_argument("--loop-pages", type=int, default=1100, help="length of the loop")
+    parser.add_argument("--space-pages", type=int, default=1 << 20, help="size of the address space")
+    parser.add_argument("--phase-events", type=int, default=1000000, help="events per phase")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--page-offset", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--binary", action="store_true", help="write a binary trace (see bintrace.py)")
+    args = parser.parse_args()
+
+    if args.binary and args.outputfile == "-":
+        print("Binary traces must be written to a file")
+        return
+    try:
+        workload = Workload(args.mix, args.hot_pages, args.zipf_alpha, args.scan_pages, args.loop_pages,
+                            args.space_pages, args.phase_events, args.write_ratio, args.seed)
+        count = write_trace(args.outputfile, workload, args.events, args.page_offset, args.binary)
+    except ValueError as e:
+        print(e)
+        return
+    except BrokenPipeError:
+        sys.stderr.close()
+        return
+    if args.outputfile != "-":
+        print(f"wrote {count} events to {args.outputfile}")
+
+
+if __name__ == "__main__":
+    main()
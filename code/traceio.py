@@ -0,0 +1,410 @@
+'''
+* Streaming, bulk trace parsing.
+* Traces are opened once and read in large buffered blocks, so memory stays
+* flat however long the trace is. gzip, xz, bzip2 and zstd compressed traces
+* (detected by their magic bytes) and stdin ("-") are streamed the same way.
+* Each block is decoded into arrays of page numbers and write flags instead of
+* one line at a time. When NumPy is available the hex decoding and the page
+* shift are done across the whole block with array operations; without it the
+* same interface falls back to plain Python lists. Binary traces (see
+* bintrace.py) are sliced straight out of the mapping. reduce_runs folds runs
+* of accesses to one page into single events before simulation.
+* parse_pid_chunks reads multi-process traces, whose lines carry a pid first.
+*
+'''
+import bz2
+import gzip
+import lzma
+import sys
+
+from bintrace import MAGIC, BinaryTrace, TraceFormatError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_BYTES = 1 << 22  # 4MB of text per block
+CHUNK_EVENTS = 1 << 20  # events per block of a binary trace
+READ_BUFFER = 1 << 20  # buffer size for the underlying file reads
+
+# policies whose state changes on a repeated hit (ARC moves the page from T1 to
+# T2, CAR sets its reference bit), so reduce_runs would change their results
+REDUCE_UNSAFE = ("arc", "car")
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+BZ2_MAGIC = b"BZh"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+if np is not None:
+    # ASCII byte -> hex digit value, 255 for anything that is not a hex digit
+    _HEX_LUT = np.full(256, 255, dtype=np.uint8)
+    for _i, _c in enumerate(b"0123456789abcdef"):
+        _HEX_LUT[_c] = _i
+    for _i, _c in enumerate(b"ABCDEF"):
+        _HEX_LUT[_c] = _i + 10
+    # two ASCII chars read as a little-endian u16 -> the byte they spell, 256 if invalid
+    _hi = _HEX_LUT[np.arange(65536) & 0xff].astype(np.uint16)
+    _lo = _HEX_LUT[np.arange(65536) >> 8].astype(np.uint16)
+    _PAIR_LUT = np.where((_hi < 16) & (_lo < 16), (_hi << 4) | _lo, 256).astype(np.uint16)
+    del _hi, _lo
+
+
+def open_trace(path):
+    """
+    Open a trace for streaming: "-" is stdin, compressed traces are recognised
+    by their magic bytes and decompressed on the fly. Raises FileNotFoundError
+    straight away if the trace does not exist.
+    """
+    if path == "-":
+        raw = sys.stdin.buffer
+    else:
+        raw = open(path, 'rb', buffering=READ_BUFFER)
+    head = raw.peek(8)[:8]
+    for magic, opener in ((GZIP_MAGIC, gzip.GzipFile), (XZ_MAGIC, lzma.LZMAFile), (BZ2_MAGIC, bz2.BZ2File)):
+        if head.startswith(magic):
+            if raw is sys.stdin.buffer:
+                return opener(fileobj=raw, mode='rb') if opener is gzip.GzipFile else opener(raw, mode='rb')
+            # reopen by name so closing the decompressor also closes the file
+            raw.close()
+            return opener(path, mode='rb')
+    if head.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise TraceFormatError("zstd compressed traces need the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER, closefd=True)
+    return raw
+
+
+def _bad_line(line_no):
+    return TraceFormatError(f"Badly formatted file. Error on line {line_no}")
+
+
+def _parse_block_py(block, page_offset, first_line):
+    """
+    Parse a block of complete lines the same way memsim always has.
+    Returns (pages, writes, error) where error is set at the first bad line.
+    """
+    pages = []
+    writes = []
+    for line_no, trace_line in enumerate(block.split(b"\n")[:-1], start=first_line):
+        trace_cmd = trace_line.strip().split(b" ")
+        try:
+            page_number = int(trace_cmd[0], 16) >> page_offset
+            op = trace_cmd[1]
+        except (ValueError, IndexError):
+            return pages, writes, _bad_line(line_no)
+        if op == b"R":
+            writes.append(False)
+        elif op == b"W":
+            writes.append(True)
+        else:
+            return pages, writes, _bad_line(line_no)
+        pages.append(page_number)
+    return pages, writes, None
+
+
+def _parse_block_np(block, page_offset):
+    """
+    Vectorised parse of a block of complete "<hex> <R|W>" lines.
+    Returns (pages, writes) as uint64/bool arrays, or None if any line does not
+    have the plain layout (the caller then re-parses the block line by line).
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    width = block.find(b"\n") + 1
+    if 0 < width < 4:
+        # too short for "<hex> <R|W>": blank or broken lines, left to the line parser
+        return None
+    if width > 0 and len(buf) % width == 0 and (buf[width - 1::width] == 10).all():
+        # fixed-width lines (the common case): view the block as an n x width matrix;
+        # the column checks below also rule out any stray newline inside a row
+        rows = buf.reshape(-1, width)
+        n = len(rows)
+        tok_len = width - 3 - int(rows[0, -2] == 13)
+        if not 1 <= tok_len <= 16:
+            return None
+        op = rows[:, tok_len + 1]
+        if not ((rows[:, tok_len] == 32).all() and ((op == 82) | (op == 87)).all()
+                and (width == tok_len + 3 or (rows[:, -2] == 13).all())):
+            return None
+        # left-pad the hex digits with '0' to 8 or 16 chars, decode them a pair at a
+        # time, and read each row of bytes as one big-endian integer
+        digits = 8 if tok_len <= 8 else 16
+        chars = np.full((n, digits), 48, dtype=np.uint8)
+        chars[:, digits - tok_len:] = rows[:, :tok_len]
+        packed = _PAIR_LUT[chars.view(np.uint16)]
+        if (packed > 255).any():
+            return None
+        values = packed.astype(np.uint8).view('>u4' if digits == 8 else '>u8').ravel().astype(np.uint64)
+        return values >> np.uint64(page_offset), op == 87
+
+    ends = np.flatnonzero(buf == 10)
+    n = len(ends)
+    if n == 0:
+        return None
+    starts = np.empty(n, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # tolerate CRLF line endings
+    line_end = ends - (buf[ends - 1] == 13)
+    tok_len = line_end - 2 - starts
+    if tok_len.min() < 1 or tok_len.max() > 16:
+        return None
+    op = buf[line_end - 1]
+    if not ((buf[line_end - 2] == 32).all() and ((op == 82) | (op == 87)).all()):
+        return None
+
+    # accumulate one hex column at a time across every line
+    values = np.zeros(n, dtype=np.uint64)
+    for j in range(int(tok_len.max())):
+        has = tok_len > j
+        nibble = _HEX_LUT[buf[np.where(has, starts + j, 0)]]
+        if (has & (nibble == 255)).any():
+            return None
+        values = np.where(has, (values << np.uint64(4)) | nibble, values)
+    return values >> np.uint64(page_offset), op == 87
+
+
+def _binary_chunks(trace_file, page_offset, chunk_events):
+    try:
+        trace = BinaryTrace(trace_file)
+    except (OSError, ValueError):
+        trace_file.close()
+        raise TraceFormatError("Binary traces must be read from an uncompressed regular file")
+    with trace:
+        shift = page_offset - trace.page_offset
+        if shift < 0:
+            raise TraceFormatError(f"Binary trace uses page offset {trace.page_offset}, larger than {page_offset}")
+        for start in range(0, len(trace), chunk_events):
+            end = min(start + chunk_events, len(trace))
+            if np is not None:
+                pages = np.frombuffer(trace.pages[start:end], dtype=trace.pages.format).astype(np.uint64)
+                # no local may keep a view into the mapping alive past close()
+                skip = start & 7
+                writes = np.unpackbits(np.frombuffer(trace.write_bits[start >> 3:(end + 7) >> 3], dtype=np.uint8),
+                                       bitorder='little')[skip:skip + end - start].astype(bool)
+                yield pages >> np.uint64(shift), writes
+            else:
+                pages = [page >> shift for page in trace.pages[start:end]]
+                writes = [trace.is_write(i) for i in range(start, end)]
+                yield pages, writes
+
+
+def _line_blocks(trace_file, chunk_bytes):
+    # (block of complete lines, line number of its first line), closing the stream at the end
+    line_no = 1
+    tail = b""
+    with trace_file:
+        while True:
+            data = trace_file.read(chunk_bytes)
+            if not data:
+                if not tail:
+                    return
+                block, tail = tail + b"\n", b""
+            else:
+                data = tail + data
+                cut = data.rfind(b"\n") + 1
+                if cut == 0:
+                    tail = data
+                    continue
+                block, tail = data[:cut], data[cut:]
+            yield block, line_no
+            line_no += block.count(b"\n")
+
+
+def _text_chunks(trace_file, page_offset, chunk_bytes):
+    for block, line_no in _line_blocks(trace_file, chunk_bytes):
+        parsed = _parse_block_np(block, page_offset) if np is not None else None
+        if parsed is None:
+            pages, writes, error = _parse_block_py(block, page_offset, line_no)
+            if pages:
+                yield pages, writes
+            if error is not None:
+                raise error
+        else:
+            yield parsed
+
+
+def parse_chunks(trace, page_offset=12, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield (pages, writes) blocks covering the whole trace in order. trace is a
+    path or a stream from open_trace; the stream is closed once consumed. Blocks
+    are NumPy arrays when NumPy is installed, lists otherwise. A badly formatted
+    line raises TraceFormatError after the events before it have been yielded.
+    """
+    trace_file = open_trace(trace) if isinstance(trace, str) else trace
+    if hasattr(trace_file, 'peek') and trace_file.peek(len(MAGIC))[:len(MAGIC)] == MAGIC:
+        return _binary_chunks(trace_file, page_offset, CHUNK_EVENTS)
+    return _text_chunks(trace_file, page_offset, chunk_bytes)
+
+
+def _parse_pid_block(block, page_offset, first_line):
+    """
+    Parse a block of complete "<pid> <hex address> <R|W>" lines.
+    Returns (pids, pages, writes, error) where error is set at the first bad line.
+    """
+    tokens = block.split()
+    lines = block.count(b"\n")
+    # every line must end in its op, or the tokens could line up across lines
+    if len(tokens) == 3 * lines and block.count(b"R\n") + block.count(b"W\n") == lines:
+        # one split and three list comprehensions for the whole block
+        ops = tokens[2::3]
+        try:
+            pids = [int(pid) for pid in tokens[0::3]]
+            pages = [int(address, 16) >> page_offset for address in tokens[1::3]]
+        except ValueError:
+            pids = None
+        if pids is not None and all(op == b"R" or op == b"W" for op in ops):
+            return pids, pages, [op == b"W" for op in ops], None
+    # go line by line to find the bad one
+    pids = []
+    pages = []
+    writes = []
+    for line_no, trace_line in enumerate(block.split(b"\n")[:-1], start=first_line):
+        fields = trace_line.split()
+        try:
+            pid = int(fields[0])
+            page_number = int(fields[1], 16) >> page_offset
+        except (ValueError, IndexError):
+            return pids, pages, writes, _bad_line(line_no)
+        if len(fields) != 3 or fields[2] not in (b"R", b"W"):
+            return pids, pages, writes, _bad_line(line_no)
+        pids.append(pid)
+        pages.append(page_number)
+        writes.append(fields[2] == b"W")
+    return pids, pages, writes, None
+
+
+def parse_pid_chunks(trace, page_offset=12, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield (pids, pages, writes) blocks of a multi-process trace: text with one
+    "<pid> <hex address> <R|W>" line per event, the pid in decimal. Otherwise
+    like parse_chunks, compressed traces and stdin included.
+    """
+    trace_file = open_trace(trace) if isinstance(trace, str) else trace
+    for block, line_no in _line_blocks(trace_file, chunk_bytes):
+        pids, pages, writes, error = _parse_pid_block(block, page_offset, line_no)
+        if pids:
+            if np is not None:
+                yield np.array(pids, dtype=np.int64), np.array(pages, dtype=np.uint64), np.array(writes)
+            else:
+                yield pids, pages, writes
+        if error is not None:
+            raise error
+
+
+def load_arrays(path, page_offset=12):
+    """
+    Decode a whole trace into (pages, writes) arrays.
+    """
+    pages = []
+    writes = []
+    for chunk_pages, chunk_writes in parse_chunks(path, page_offset):
+        pages.append(chunk_pages)
+        writes.append(chunk_writes)
+    if np is not None:
+        if not pages:
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+        return np.concatenate(pages), np.concatenate(writes)
+    return [p for chunk in pages for p in chunk], [w for chunk in writes for w in chunk]
+
+
+def _reduce_block(pages, writes):
+    # (run pages, OR of each run's write flags, run lengths)
+    if np is not None and isinstance(pages, np.ndarray):
+        if len(pages) == 0:
+            return pages, writes, np.zeros(0, dtype=np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], pages[1:] != pages[:-1])))
+        counts = np.diff(np.append(starts, len(pages)))
+        return pages[starts], np.logical_or.reduceat(writes, starts), counts
+    run_pages = []
+    run_writes = []
+    counts = []
+    last = None
+    for page_number, is_write in zip(pages, writes):
+        if page_number == last and counts:
+            run_writes[-1] = run_writes[-1] or bool(is_write)
+            counts[-1] += 1
+        else:
+            run_pages.append(page_number)
+            run_writes.append(bool(is_write))
+            counts.append(1)
+            last = page_number
+    return run_pages, run_writes, counts
+
+
+def reduce_arrays(pages, writes):
+    """
+    Fold each run of consecutive accesses to one page into a single event whose
+    write flag is the OR of the run's flags. Returns (pages, writes, counts),
+    counts holding the length of each run.
+    """
+    return _reduce_block(pages, writes)
+
+
+def reduce_runs(blocks):
+    """
+    Streaming reduce_arrays over (pages, writes) blocks: yields
+    (pages, writes, events), events being the number of original events the
+    block stands for. A run that crosses a block boundary is carried over, so
+    the output is the same however the trace was cut into blocks.
+
+    Repeated accesses to a resident page are hits that only OR in the dirty bit
+    (and re-set a use bit or LRU position that is already set), so rand, lru,
+    clock, esc and opt report the same reads, writes and faults on the reduced
+    stream. ARC and CAR do not (see REDUCE_UNSAFE).
+    """
+    carry = None  # (page, write, count) of the run at the end of the last block
+    for pages, writes in blocks:
+        if len(pages) == 0:
+            continue
+        run_pages, run_writes, counts = _reduce_block(pages, writes)
+        is_array = np is not None and isinstance(run_pages, np.ndarray)
+        if carry is not None:
+            page, write, count = carry
+            if run_pages[0] == page:
+                run_writes[0] = run_writes[0] or write
+                counts[0] += count
+            elif is_array:
+                run_pages = np.concatenate((np.array([page], dtype=run_pages.dtype), run_pages))
+                run_writes = np.concatenate(([write], run_writes))
+                counts = np.concatenate(([count], counts))
+            else:
+                run_pages = [page] + run_pages
+                run_writes = [write] + run_writes
+                counts = [count] + counts
+        # the last run may continue into the next block
+        carry = (int(run_pages[-1]), bool(run_writes[-1]), int(counts[-1]))
+        if len(run_pages) > 1:
+            events = int(counts[:-1].sum()) if is_array else sum(counts[:-1])
+            yield run_pages[:-1], run_writes[:-1], events
+    if carry is not None:
+        page, write, count = carry
+        if np is not None:
+            yield np.array([page], dtype=np.uint64), np.array([write]), count
+        else:
+            yield [page], [write], count
+
+
+def replay(engine, pages, writes):
+    """
+    Feed (pages, writes) arrays to any engine, through its process_batch hot
+    loop when it has one, else one read_memory/write_memory call per event.
+    """
+    if hasattr(engine, 'process_batch'):
+        engine.process_batch(pages, writes)
+        return
+    if np is not None and isinstance(pages, np.ndarray):
+        # Python ints are much cheaper to hash and compare than NumPy scalars
+        pages = pages.tolist()
+        writes = writes.tolist()
+    read_memory = engine.read_memory
+    write_memory = engine.write_memory
+    for page_number, is_write in zip(pages, writes):
+        if is_write:
+            write_memory(page_number)
+        else:
+            read_memory(page_number)
@@ -0,0 +1,95 @@
+'''
+* Structured event tracing for the MMUs.
+* Instead of formatting a debug string for every access, an MMU with a tracer
+* attached records one fixed-size binary record per access:
+*   (event index, op, page, frame, victim page, victim written back)
+* Records go to an in-memory ring buffer (the last `capacity` events) and,
+* optionally, to a log file; pretty-printing happens separately, on demand.
+* With no tracer attached (the default) the MMUs skip all of this.
+*
+'''
+from collections import deque
+import argparse
+import struct
+import sys
+
+READ_HIT = 0
+READ_MISS = 1
+WRITE_HIT = 2
+WRITE_MISS = 3
+OP_NAMES = ("READ HIT", "READ MISS", "WRITE HIT", "WRITE MISS")
+
+# index (u64), op (u8), victim dirty (u8), page, frame, victim (i64, -1 = none)
+RECORD = struct.Struct("<QBB6xqqq")
+
+
+def format_record(record):
+    index, op, dirty, page, frame, victim = record
+    line = f"#{index} {OP_NAMES[op]} page {page} in frame {frame}"
+    if victim >= 0:
+        line += f" (evicted page {victim}{', written back' if dirty else ''})"
+    return line
+
+
+class EventTracer:
+    def __init__(self, capacity=65536, path=None, echo=False):
+        self.capacity = capacity
+        self.ring = bytearray(capacity * RECORD.size)
+        self.count = 0
+        self.echo = echo
+        self._file = open(path, 'wb') if path is not None else None
+
+    def record(self, op, page, frame, victim=None, victim_dirty=False):
+        rec = (self.count, op, bool(victim_dirty), page, frame, -1 if victim is None else victim)
+        RECORD.pack_into(self.ring, (self.count % self.capacity) * RECORD.size, *rec)
+        self.count += 1
+        if self._file is not None:
+            self._file.write(RECORD.pack(*rec))
+        if self.echo:
+            print(format_record(rec))
+
+    def records(self):
+        # ring buffer contents, oldest first
+        first = max(0, self.count - self.capacity)
+        return [RECORD.unpack_from(self.ring, (i % self.capacity) * RECORD.size)
+                for i in range(first, self.count)]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_log(path):
+    # yields records from a log file written by an EventTracer
+    with open(path, 'rb') as log:
+        while True:
+            data = log.read(RECORD.size * 4096)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pretty-print an MMU event log.")
+    parser.add_argument("logfile")
+    parser.add_argument("--tail", type=int, default=None, help="only the last N events")
+    parser.add_argument("--page", type=int, default=None, help="only events touching this page")
+    args = parser.parse_args()
+
+    try:
+        records = read_log(args.logfile)
+        if args.page is not None:
+            records = (r for r in records if r[3] == args.page or r[5] == args.page)
+        if args.tail is not None:
+            records = deque(records, maxlen=args.tail)
+        for record in records:
+            print(format_record(record))
+    except FileNotFoundError:
+        print(f"Input '{args.logfile}' could not be found")
+    except BrokenPipeError:
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()